@@ -0,0 +1,82 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Synthetic local TileDB arrays for the benchmarks."""
+
+import os
+
+import numpy as np
+import pytest
+import tiledb
+
+# number of points of the synthetic point cloud, BENCHMARK_POINTS=100000000 to size hardware
+NUM_POINTS = int(os.environ.get("BENCHMARK_POINTS", 2_000_000))
+EXTENT = 1000.0
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(0, EXTENT, size=(2, n))
+    return {
+        "X": x,
+        "Y": y,
+        # a terrain like surface, as in LiDAR data
+        "Z": 50 + 20 * np.sin(x / 100) * np.cos(y / 150) + rng.normal(0, 0.5, n),
+        "Red": rng.integers(0, 65535, n, dtype=np.uint16),
+        "Green": rng.integers(0, 65535, n, dtype=np.uint16),
+        "Blue": rng.integers(0, 65535, n, dtype=np.uint16),
+    }
+
+
+def create_points_array(uri, num_points, fragments=1, capacity=100_000):
+    dims = [
+        tiledb.Dim(name=name, domain=(0.0, EXTENT), tile=EXTENT / 10, dtype=np.float64)
+        for name in ["X", "Y", "Z"]
+    ]
+    attrs = [
+        tiledb.Attr(name=name, dtype=np.uint16) for name in ["Red", "Green", "Blue"]
+    ]
+    schema = tiledb.ArraySchema(
+        domain=tiledb.Domain(*dims),
+        attrs=attrs,
+        sparse=True,
+        capacity=capacity,
+        allows_duplicates=True,
+    )
+    tiledb.Array.create(uri, schema)
+
+    per_fragment = num_points // fragments
+    for f in range(fragments):
+        points = random_points(per_fragment, seed=f)
+        with tiledb.open(uri, "w") as arr:
+            arr[points["X"], points["Y"], points["Z"]] = {
+                name: points[name] for name in ["Red", "Green", "Blue"]
+            }
+    return uri
+
+
+def bbox_fraction(fraction):
+    """bbox covering the given fraction of the XY extent and the full Z range."""
+    side = EXTENT * np.sqrt(fraction)
+    return {"X": [0, side], "Y": [0, side], "Z": [0, EXTENT]}
+
+
+@pytest.fixture(scope="session")
+def points_array(tmp_path_factory):
+    return create_points_array(
+        str(tmp_path_factory.mktemp("benchmarks") / "points"), NUM_POINTS
+    )
+
+
+@pytest.fixture(scope="session")
+def fragments_arrays(tmp_path_factory):
+    """Arrays with an increasing number of fragments and MBRs."""
+    root = tmp_path_factory.mktemp("fragments")
+    return {
+        (fragments, capacity): create_points_array(
+            str(root / f"{fragments}_{capacity}"),
+            200_000,
+            fragments=fragments,
+            capacity=capacity,
+        )
+        for fragments, capacity in [(10, 10_000), (100, 1_000), (200, 100)]
+    }
@@ -0,0 +1,52 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Benchmarks of the functions reading and checking the point cloud data."""
+
+import pytest
+
+from pybabylonjs.args import check_point_cloud_data_dict
+from pybabylonjs.data import create_mbrs, create_point_cloud
+from pybabylonjs.fragments import FragmentIndex
+
+from .conftest import NUM_POINTS, bbox_fraction, random_points
+
+
+@pytest.mark.parametrize("fraction", [0.01, 0.1, 1.0])
+def test_create_point_cloud(benchmark, points_array, fraction):
+    bbox = bbox_fraction(fraction)
+    data = benchmark(create_point_cloud, points_array, bbox, cache=False)
+    benchmark.extra_info["points"] = int(data["X"].size)
+
+
+def test_create_point_cloud_cached(benchmark, points_array):
+    bbox = bbox_fraction(0.1)
+    create_point_cloud(points_array, bbox)
+    benchmark(create_point_cloud, points_array, bbox)
+
+
+@pytest.mark.parametrize("layout", [(10, 10_000), (100, 1_000), (200, 100)])
+def test_create_mbrs(benchmark, fragments_arrays, layout):
+    d = benchmark(create_mbrs, fragments_arrays[layout])
+    benchmark.extra_info["fragments"] = layout[0]
+    benchmark.extra_info["mbrs"] = int(d["data"]["Xmin"].size)
+
+
+def test_check_point_cloud_data_dict(benchmark):
+    data = random_points(NUM_POINTS)
+    benchmark(check_point_cloud_data_dict, data)
+
+
+@pytest.mark.parametrize("num_threads", [1, 4, 16])
+def test_create_point_cloud_parallel(benchmark, points_array, num_threads):
+    bbox = bbox_fraction(1.0)
+    benchmark(
+        create_point_cloud, points_array, bbox, cache=False, num_threads=num_threads
+    )
+
+
+@pytest.mark.parametrize("layout", [(10, 10_000), (100, 1_000), (200, 100)])
+def test_fragment_index_query(benchmark, fragments_arrays, layout):
+    index = FragmentIndex.from_array(fragments_arrays[layout])
+    mbrs = benchmark(index.query, bbox_fraction(0.01))
+    benchmark.extra_info["mbrs"] = len(index)
+    benchmark.extra_info["hits"] = int(mbrs.size)
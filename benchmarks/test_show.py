@@ -0,0 +1,48 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""End to end benchmarks of building point cloud widgets and their payload."""
+
+import pytest
+from ipywidgets.widgets.widget import _remove_buffers
+
+from pybabylonjs import Show
+from pybabylonjs.data import slice_cache
+
+from pybabylonjs.tests.conftest import widgets  # noqa: F401
+
+from .conftest import bbox_fraction, random_points
+
+
+def record_payload(benchmark, widget):
+    """Number of points and bytes of binary buffers sent to the frontend."""
+    _, _, buffers = _remove_buffers(widget.get_state())
+    benchmark.extra_info["points"] = int(widget.value["data"]["X"].size)
+    benchmark.extra_info["buffer_bytes"] = sum(memoryview(b).nbytes for b in buffers)
+
+
+@pytest.mark.parametrize("quantize", [None, True])
+def test_show_point_cloud_local(benchmark, widgets, points_array, quantize):
+    bbox = bbox_fraction(0.1)
+
+    def show():
+        slice_cache.clear()
+        widget = Show.point_cloud(
+            uri=points_array, source="local", bbox=bbox, quantize=quantize
+        )
+        # serialize the state as it is sent over the comm
+        return _remove_buffers(widget.get_state())
+
+    benchmark(show)
+    record_payload(benchmark, widgets[-1])
+
+
+@pytest.mark.parametrize("point_budget", [None, 100_000])
+def test_show_point_cloud_dict(benchmark, widgets, point_budget):
+    data = random_points(1_000_000)
+
+    def show():
+        widget = Show.point_cloud(source="dict", data=data, point_budget=point_budget)
+        return _remove_buffers(widget.get_state())
+
+    benchmark(show)
+    record_payload(benchmark, widgets[-1])
@@ -5,9 +5,8 @@ from ._version import __version__
 
 HERE = Path(__file__).parent.resolve()
 
-with (HERE / "labextension" / "package.json").open() as fid:
-    data = json.load(fid)
-
 
 def _jupyter_labextension_paths():
+    with (HERE / "labextension" / "package.json").open() as fid:
+        data = json.load(fid)
     return [{"src": "labextension", "dest": data["name"]}]
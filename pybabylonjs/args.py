@@ -2,10 +2,18 @@
 # Licensed under the MIT License.
 """Functions to format and check the data and keyword arguments for each data source and visualization mode."""
 
+import logging
 import os
 from urllib.parse import urlparse
 
+import numpy as np
+
 from .data import *
+from .octree import DEFAULT_POINT_BUDGET, PointCloudOctree
+from .plan import batch_size, plan_point_cloud, read_point_cloud
+from .stats import phase
+
+logger = logging.getLogger(__name__)
 
 POINT_CLOUD_ARGS_DEFAULTS = {
     "width": None,
@@ -38,6 +46,13 @@ POINT_CLOUD_ARGS_DEFAULTS = {
     "use_sps": None,
     "debug": False,
     "worker_pool_size": None,
+    "quantize": None,
+    "num_threads": None,
+    "attributes": None,
+    "color_by": None,
+    "color_ramp": None,
+    "compression": None,
+    "memory_budget": None,
 }
 
 IMAGE_ARGS_DEFAULTS = {
@@ -55,6 +70,8 @@ IMAGE_ARGS_DEFAULTS = {
     "tiledb_env": None,
     "default_channels": None,
     "scene_config": None,
+    "tile_size": None,
+    "num_threads": None,
 }
 
 
@@ -114,35 +131,123 @@ def check_point_cloud_args(source, streaming, point_cloud_args_in):
                 )
         point_cloud_args = {**point_cloud_args, "token": token}
 
+    attributes = point_cloud_args.get("attributes")
+    color_by = point_cloud_args.get("color_by")
+    if attributes is not None:
+        attributes = list(attributes)
+        if color_by is None and not {"Red", "Green", "Blue"} <= set(attributes):
+            # without colors the points are colored by the first attribute
+            color_by = attributes[0]
+        if color_by is not None and color_by not in attributes:
+            attributes.append(color_by)
+    elif color_by is not None:
+        attributes = [color_by]
+    if attributes is not None:
+        point_cloud_args = {
+            **point_cloud_args,
+            "attributes": attributes,
+            "color_by": color_by,
+        }
+
     return point_cloud_args
 
 
-def check_point_cloud_data_dict(data):
-    for var in ["X", "Y", "Z", "Red", "Green", "Blue"]:
+def check_point_cloud_data_dict(data, attributes=None, color_by=None, columns=None):
+    data = point_cloud_columns(data, columns)
+    required = ["X", "Y", "Z"] + (
+        [color_by] if color_by is not None else ["Red", "Green", "Blue"]
+    )
+    for var in required + list(attributes or []):
         if not var in data:
             raise ValueError("Data dictionary does not contain " + var)
-    if not (
-        data["X"].size
-        == data["Y"].size
-        == data["Z"].size
-        == data["Red"].size
-        == data["Green"].size
-        == data["Blue"].size
-    ):
+    if attributes is not None:
+        # only the requested attributes are sent to the visualization
+        data = {key: data[key] for key in ["X", "Y", "Z"] + list(attributes)}
+    if len({col.size for col in data.values()}) > 1:
         raise ValueError("Attributes in data dictionary do not have the same length.")
 
     return data
 
 
-def check_point_cloud_data_local(uri, point_cloud_args):
+def check_point_cloud_data_budget(data, point_cloud_args, sampling):
+    point_budget = point_cloud_args.get("point_budget")
+    if point_budget is None or sampling is None:
+        return data
+
+    with phase("sample"):
+        return downsample_point_cloud(data, point_budget, sampling)
+
+
+def check_point_cloud_data_local(uri, point_cloud_args, timestamp=None, sampling=None):
     if os.path.isdir(uri) == False:
         raise ValueError("uri: " + uri + " does not exist.")
     if not "bbox" in point_cloud_args:
         raise ValueError("The bbox for slicing data from the array is not specified")
 
-    data = create_point_cloud(uri, point_cloud_args["bbox"])
+    if point_cloud_args.get("buffer_size"):
+        return iter_point_cloud(
+            uri,
+            point_cloud_args["bbox"],
+            point_cloud_args["buffer_size"],
+            point_cloud_args.get("attributes"),
+            timestamp,
+        )
 
-    return data
+    # estimate the size of the read first, reads that do not fit in the
+    # memory budget are chunked or sampled instead of exhausting the memory
+    plan = plan_point_cloud(
+        uri,
+        point_cloud_args["bbox"],
+        point_cloud_args.get("attributes"),
+        point_cloud_args.get("memory_budget"),
+        point_cloud_args.get("point_budget") if sampling is not None else None,
+        timestamp,
+    )
+    if plan.strategy == "chunked":
+        # recorded in the value of the widget, which only holds the first batch
+        point_cloud_args["buffer_size"] = plan.buffer_size
+    if plan.strategy != "read":
+        logger.warning(
+            "About %d points (%d bytes) inside the bbox exceed the memory budget of "
+            "%d bytes, %s",
+            plan.points,
+            plan.nbytes,
+            plan.memory_budget,
+            (
+                f"showing a sample of {plan.point_budget} points"
+                if plan.strategy == "sample"
+                else "reading them in batches"
+            ),
+        )
+
+    return read_point_cloud(
+        uri,
+        point_cloud_args["bbox"],
+        plan,
+        point_cloud_args.get("attributes"),
+        sampling,
+        timestamp,
+        point_cloud_args.get("num_threads"),
+    )
+
+
+def check_point_cloud_data_local_streaming(uri, point_cloud_args):
+    if os.path.isdir(uri) == False:
+        raise ValueError("uri: " + uri + " does not exist.")
+
+    # about 20 nodes fit in the budget: the root, its children and part of the next level
+    point_budget = point_cloud_args.get("point_budget") or DEFAULT_POINT_BUDGET
+
+    return PointCloudOctree(
+        uri,
+        point_cloud_args.get("bbox"),
+        node_size=max(point_budget // 20, 1),
+        buffer_size=point_cloud_args.get("buffer_size")
+        or batch_size(
+            point_cloud_args.get("memory_budget"), point_cloud_args.get("attributes")
+        ),
+        attrs=point_cloud_args.get("attributes"),
+    )
 
 
 def check_point_cloud_data_cloud(streaming, uri, point_cloud_args):
@@ -166,3 +271,64 @@ def check_point_cloud_data_cloud(streaming, uri, point_cloud_args):
         }
 
     return point_cloud_args
+
+
+def check_scene_layer(layer, index, sampling):
+    """Read the data of a layer of a scene, a point cloud from a "dict" or "local"
+    source or the MBRs of an array.
+
+    :param layer: dict with the kind of the layer, "point_cloud" (default) or
+        "mbrs", its name, visible, color and the arguments of its source
+    :param index: position of the layer, names unnamed layers
+    """
+    layer = dict(layer)
+    kind = layer.pop("kind", "point_cloud")
+    d = {
+        "name": str(layer.pop("name", "layer " + str(index))),
+        "kind": kind,
+        "visible": bool(layer.pop("visible", True)),
+        "color": layer.pop("color", None),
+    }
+
+    if kind == "mbrs":
+        box_budget = layer.get("box_budget")
+        mbrs = create_mbrs(
+            layer["uri"],
+            box_budget,
+            layer.get("bbox") if box_budget is not None else None,
+        )
+        return {**d, "data": mbrs["data"]}
+    if kind != "point_cloud":
+        raise ValueError("Unknown kind of scene layer: " + str(kind))
+
+    source = layer.get("source", "dict")
+    if source == "dict":
+        data = check_point_cloud_data_dict(layer["data"], columns=layer.get("columns"))
+    elif source == "local":
+        uri = layer.get("uri")
+        if uri is None or os.path.isdir(uri) == False:
+            raise ValueError("uri: " + str(uri) + " does not exist.")
+        if not "bbox" in layer:
+            raise ValueError(
+                "The bbox for slicing data from the array is not specified"
+            )
+        # a layer is sent at once, reads exceeding the memory budget are sampled
+        data = check_point_cloud_data_local(
+            uri,
+            {
+                **layer,
+                "buffer_size": None,
+                "point_budget": layer.get("point_budget") or DEFAULT_POINT_BUDGET,
+            },
+            sampling=layer.get("sampling", sampling),
+        )
+    else:
+        raise ValueError(
+            "Scene layers are read from a dict or local source, not " + str(source)
+        )
+
+    data = check_point_cloud_data_budget(data, layer, layer.get("sampling", sampling))
+    rgb_max = layer.get("rgb_max")
+    if rgb_max is None:
+        rgb_max = 255 if np.asarray(data["Red"]).dtype.itemsize == 1 else 65535
+    return {**d, "data": data, "bbox": layer.get("bbox"), "rgb_max": rgb_max}
@@ -7,14 +7,47 @@
 """
 BabylonJS Jupyter Widget
 """
+
 import logging
+import weakref
 
-logger = logging.Logger("logger")
+logger = logging.getLogger(__name__)
 
+import numpy as np
 from ipywidgets import DOMWidget, register
 
 from traitlets import Dict, Unicode
 from ._frontend import module_name, module_version
+from .args import check_point_cloud_data_budget
+from .data import (
+    create_mbrs,
+    create_point_cloud_since,
+    create_point_cloud_update,
+    latest_timestamp,
+    slice_cache,
+)
+from .export import export_html
+from .serializers import array_to_json, data_to_buffers, encoding, value_serialization
+from .stats import LoadStats
+
+# the open widgets, for memory_usage
+_widgets = weakref.WeakSet()
+
+
+def _columns_nbytes(data):
+    if not isinstance(data, dict):
+        return 0
+    return sum(col.nbytes for col in data.values() if hasattr(col, "nbytes"))
+
+
+def memory_usage():
+    """The open widgets and the bytes of the data they hold in the kernel, largest first.
+
+    Closing a widget or releasing its data frees its share, see BabylonBase.release.
+    A slice of a local array shared by widgets is dropped from the slice cache
+    with the last widget holding it.
+    """
+    return sorted(((w, w.nbytes) for w in list(_widgets)), key=lambda item: -item[1])
 
 
 class BabylonBase(DOMWidget):
@@ -25,6 +58,79 @@ class BabylonBase(DOMWidget):
     _view_module_version = Unicode(module_version).tag(sync=True)
     _view_module = Unicode(module_name).tag(sync=True)
 
+    def __init__(self, **kwargs):
+        # set before super().__init__, which serializes the initial value
+        self.stats = LoadStats(type(self).__name__)
+        # drop the data once the frontend has received it
+        self.release_data = False
+        self.released = False
+        # key of the cached slice shown by the widget, held until it is released
+        self.slice_key = None
+        # points and bytes of the data of the value as last encoded
+        self.encoded_size = (0, 0)
+        super().__init__(**kwargs)
+        _widgets.add(self)
+        self.on_msg(self._handle_value_received)
+
+    def _handle_value_received(self, widget, content, buffers):
+        if content.get("type") == "value_received" and self.release_data:
+            self.release()
+
+    def set_value(self, value):
+        """Set the value and count the data it sends in the stats.
+
+        Syncing the same value again to a new view is not counted.
+        """
+        with self.stats.activate(), self.stats.phase("sync"):
+            self.value = value
+        points, nbytes = self.encoded_size
+        if nbytes:
+            self.stats.record_sent(points, nbytes)
+
+    @property
+    def nbytes(self):
+        """Bytes of the columns of the data held by the widget, including the
+        columns shared with other widgets showing the same cached slice."""
+        value = self.value if isinstance(self.value, dict) else {}
+        return _columns_nbytes(value.get("data")) + sum(
+            _columns_nbytes(layer.get("data")) for layer in value.get("layers") or []
+        )
+
+    def release(self):
+        """Drop the columns of the data held by the widget, keeping its other settings.
+
+        The frontend keeps showing the data it has received, but a view created
+        after the page is reloaded shows no data and the widget cannot be exported.
+
+        :return: number of bytes released
+        """
+        nbytes = self.nbytes
+        # changed in place, assigning the value would sync it to the frontend
+        value = self.value
+        if isinstance(value.get("data"), dict) and value["data"]:
+            value["data"] = {}
+            self.released = True
+        for layer in value.get("layers") or []:
+            if layer.get("data"):
+                layer["data"] = {}
+                self.released = True
+        if self.slice_key is not None:
+            slice_cache.release(self.slice_key)
+            self.slice_key = None
+        if nbytes:
+            logger.debug("Released %d bytes of %s", nbytes, type(self).__name__)
+        return nbytes
+
+    def close(self):
+        """Close the widget and drop the data it holds."""
+        super().close()
+        self.release()
+        _widgets.discard(self)
+
+    def export_html(self, path, **kwargs):
+        """Write a static HTML page showing the widget, see export.export_html."""
+        export_html(self, path, **kwargs)
+
 
 @register
 class BabylonPointCloud(BabylonBase):
@@ -32,7 +138,144 @@ class BabylonPointCloud(BabylonBase):
 
     _model_name = Unicode("BabylonPointCloudModel").tag(sync=True)
     _view_name = Unicode("BabylonPointCloudView").tag(sync=True)
-    value = Dict().tag(sync=True)
+    value = Dict().tag(sync=True, **value_serialization)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # PointCloudOctree of a local array streamed to the frontend and its nodes already sent
+        self.octree = None
+        self.sent_nodes = set()
+        # bbox of the points shown in the frontend after update_bbox
+        self.bbox = None
+        # downsampling method of the point budget, also used by update_bbox
+        self.sampling = "voxel"
+        # timestamp of the latest write shown of a local slice, advanced by refresh
+        self.timestamp = None
+        # whether refresh appended points, which are only kept in the frontend
+        self.refreshed = False
+        # coordinates of the points shown with a point budget, see update_bbox
+        self.shown = None
+        self.on_msg(self._on_custom_msg)
+
+    def _on_custom_msg(self, widget, content, buffers):
+        if content.get("type") == "request_nodes" and self.octree is not None:
+            self.send_nodes(content.get("point_budget"), content.get("bbox"))
+
+    def send_nodes(self, point_budget=None, bbox=None):
+        """Send the octree nodes that fit in the point budget and have not been sent yet.
+
+        :param point_budget: maximum number of points shown, including the points sent before
+        :param bbox: only send nodes intersecting this bbox
+        """
+        for key, data in self.octree.traverse(point_budget, bbox, self.sent_nodes):
+            self.sent_nodes.add(key)
+            self.append(data)
+
+    def update_bbox(self, bbox):
+        """Move the slice of a local point cloud to a new bbox.
+
+        Only the points inside the new bbox that were not inside the current one
+        are read and sent, and the frontend drops the points outside the new
+        bbox. With a point budget, the new points are downsampled to the part of
+        the budget not used by the points kept, whose coordinates are kept in
+        the kernel for this. After the data has been released the points kept
+        are not known and the new points use the whole budget. value["bbox"] is
+        updated in place, the points themselves are only kept in the frontend.
+        """
+        if self.value.get("source") != "local" or self.octree is not None:
+            raise ValueError("update_bbox is only supported for local slices")
+        if self.bbox is None:
+            self.bbox = self.value["bbox"]
+
+        point_budget = self.value.get("point_budget")
+        if point_budget is not None:
+            shown = self._shown()
+            inside = np.logical_and.reduce(
+                [
+                    (shown[dim] >= bbox[dim][0]) & (shown[dim] <= bbox[dim][1])
+                    for dim in ["X", "Y", "Z"]
+                ]
+            )
+            self.shown = {dim: col[inside] for dim, col in shown.items()}
+            point_budget -= int(inside.sum())
+
+        self.send({"type": "crop", "bbox": bbox})
+        # the new region is not read when the points kept use the whole budget
+        if point_budget is None or point_budget > 0:
+            data = create_point_cloud_update(
+                self.value["uri"],
+                bbox,
+                self.bbox,
+                self.value.get("attributes"),
+                self.timestamp,
+            )
+            data = check_point_cloud_data_budget(
+                data, {"point_budget": point_budget}, self.sampling
+            )
+            if data["X"].size > 0:
+                self.append(data)
+        self.bbox = bbox
+        # changed in place, assigning the value would send the old points again
+        self.value["bbox"] = bbox
+
+    def refresh(self):
+        """Append the points written to a local slice since it was read.
+
+        Only the fragments written after the previous read are opened, with a
+        TileDB timestamp range, and only their points inside the bbox are sent.
+        The new points are not downsampled to the point budget.
+
+        :return: number of points appended
+        """
+        if self.value.get("source") != "local" or self.octree is not None:
+            raise ValueError("refresh is only supported for local slices")
+
+        until = latest_timestamp(self.value["uri"])
+        data = create_point_cloud_since(
+            self.value["uri"],
+            self.bbox or self.value["bbox"],
+            self.timestamp,
+            until,
+            self.value.get("attributes"),
+        )
+        if data["X"].size > 0:
+            self.append(data)
+            self.refreshed = True
+        if until is not None:
+            self.timestamp = until
+        return data["X"].size
+
+    def close(self):
+        self.octree = None
+        self.shown = None
+        super().close()
+
+    def _shown(self):
+        """Coordinates of the points shown, starting from the points of the value."""
+        if self.shown is None:
+            data = self.value.get("data") or {}
+            self.shown = {
+                dim: np.asarray(data.get(dim, np.empty(0))) for dim in ["X", "Y", "Z"]
+            }
+        return self.shown
+
+    def append(self, data):
+        """Append points to the point cloud without sending the points already shown.
+
+        The appended points are only kept in the frontend, value["data"] is not changed.
+        """
+        with self.stats.phase("encode"):
+            columns, buffers = data_to_buffers(data, encoding(self.value))
+        with self.stats.phase("sync"):
+            self.send({"type": "append", "columns": columns}, buffers)
+        nbytes = sum(buffer.nbytes for buffer in buffers)
+        self.stats.record_sent(data["X"].size, nbytes)
+        if self.value.get("point_budget") is not None and self.octree is None:
+            shown = self._shown()
+            self.shown = {
+                dim: np.concatenate([col, data[dim]]) for dim, col in shown.items()
+            }
+        logger.debug("Appended %d points (%d bytes)", data["X"].size, nbytes)
 
 
 @register
@@ -41,7 +284,101 @@ class BabylonMBRS(BabylonBase):
 
     _model_name = Unicode("BabylonMBRSModel").tag(sync=True)
     _view_name = Unicode("BabylonMBRSView").tag(sync=True)
-    value = Dict().tag(sync=True)
+    value = Dict().tag(sync=True, **value_serialization)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # timestamp of the latest write shown, advanced by refresh
+        self.timestamp = None
+        self.on_msg(self._on_custom_msg)
+
+    def _on_custom_msg(self, widget, content, buffers):
+        if content.get("type") == "request_boxes":
+            self.drill(content.get("bbox"), content.get("box_budget"))
+
+    def drill(self, bbox=None, box_budget=None):
+        """Show finer boxes inside a bbox, or the whole array again when bbox is None.
+
+        :param box_budget: maximum number of boxes, defaults to the current budget
+            of the widget, refresh uses the new budget as well
+        """
+        if box_budget is None:
+            box_budget = self.value.get("box_budget")
+        if box_budget is None:
+            raise ValueError("drill requires a box_budget")
+        self.timestamp = latest_timestamp(self.value["uri"])
+        d = create_mbrs(self.value["uri"], box_budget, bbox, until=self.timestamp)
+        self.set_value({**self.value, **d, "bbox": bbox, "box_budget": box_budget})
+
+    def refresh(self):
+        """Add the outlines of the fragments written since the MBRs were read.
+
+        The box budget applies to the new fragments alone, the boxes already
+        shown are kept. The new boxes are added to value["data"] in place, so a
+        new view or an export shows them without sending them again to the
+        views already showing the widget.
+
+        :return: number of boxes added
+        """
+        until = latest_timestamp(self.value["uri"])
+        d = create_mbrs(
+            self.value["uri"],
+            self.value.get("box_budget"),
+            self.value.get("bbox"),
+            since=self.timestamp,
+            until=until,
+        )
+        self.timestamp = until
+        if d is None:
+            return 0
+
+        extents = self.value["extents"]
+        extents = [
+            min(a, b) if i % 2 == 0 else max(a, b)
+            for i, (a, b) in enumerate(zip(extents, d["extents"]))
+        ]
+        with self.stats.phase("encode"):
+            columns, buffers = data_to_buffers(d["data"], encoding(self.value))
+        with self.stats.phase("sync"):
+            self.send(
+                {"type": "append", "columns": columns, "extents": extents}, buffers
+            )
+        self.stats.record_sent(
+            d["data"]["Xmin"].size, sum(buffer.nbytes for buffer in buffers)
+        )
+
+        # changed in place, assigning the value would send every box again
+        data = self.value.get("data")
+        if data and not self.released:
+            self.value["data"] = {
+                name: np.concatenate([data[name], d["data"][name]]) for name in data
+            }
+        self.value["extents"] = extents
+        return d["data"]["Xmin"].size
+
+
+@register
+class BabylonScene(BabylonBase):
+    """Point clouds and MBRs shown as layers of one BabylonJS scene"""
+
+    _model_name = Unicode("BabylonSceneModel").tag(sync=True)
+    _view_name = Unicode("BabylonSceneView").tag(sync=True)
+    value = Dict().tag(sync=True, **value_serialization)
+
+    @property
+    def layers(self):
+        """Names of the layers, from the bottom to the top."""
+        return [layer["name"] for layer in self.value.get("layers", [])]
+
+    def set_visible(self, name: str, visible: bool = True):
+        """Show or hide a layer, the frontend keeps the data of hidden layers
+        so it is not sent again."""
+        for layer in self.value.get("layers", []):
+            if layer["name"] == name:
+                layer["visible"] = bool(visible)
+                self.send({"type": "visibility", "layer": name, "visible": visible})
+                return
+        raise ValueError("Scene has no layer " + name)
 
 
 @register
@@ -51,3 +388,35 @@ class BabylonImage(BabylonBase):
     _model_name = Unicode("BabylonTileImageModel").tag(sync=True)
     _view_name = Unicode("BabylonTileImageView").tag(sync=True)
     value = Dict().tag(sync=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # ImageTileServer of a local image answering the tile requests of the frontend
+        self.tile_server = None
+        self.on_msg(self._on_custom_msg)
+
+    def _on_custom_msg(self, widget, content, buffers):
+        if content.get("type") == "request_tile" and self.tile_server is not None:
+            self.request_tile(
+                content["level"], content["row"], content["col"], content.get("id")
+            )
+
+    def request_tile(self, level, row, col, id=None):
+        """Read a tile of the local image on the thread pool of the tile server
+        and send it to the frontend with the id of the request."""
+        header = {"type": "tile", "id": id, "level": level, "row": row, "col": col}
+
+        def send(tile, error):
+            if error is not None:
+                self.send({**header, "error": str(error)})
+                return
+            encoded = array_to_json(tile)
+            buffer = encoded.pop("buffer")
+            self.send({**header, **encoded}, [buffer])
+
+        return self.tile_server.submit(level, row, col, send)
+
+    def close(self):
+        if self.tile_server is not None:
+            self.tile_server.close()
+        super().close()
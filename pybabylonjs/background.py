@@ -0,0 +1,65 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Loading the data of a visualization on a background thread."""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(thread_name_prefix="pybabylonjs")
+
+# cancellation events of the running loads, by notebook cell
+_loads = {}
+_lock = threading.Lock()
+
+
+def cell_id():
+    """Id of the notebook cell being executed, None outside a notebook."""
+    try:
+        from IPython import get_ipython
+
+        parent = get_ipython().parent_header
+    except AttributeError:
+        return None
+    return (parent or {}).get("metadata", {}).get("cellId")
+
+
+def load_in_background(dataviz, load, key=None):
+    """Run load(cancelled) on a background thread to fill in a displayed widget.
+
+    A load started before with the same key, by default from the same notebook
+    cell, is cancelled: its cancelled event is set and the load should stop
+    sending data to its widget as soon as it sees it.
+
+    :param dataviz: the widget, which shows the error when load raises
+    :param load: function reading and sending the data, called with a threading.Event
+    :param key: key of the load, defaults to the id of the current notebook cell
+    :return: the Future of the load and its cancelled event
+    """
+    if key is None:
+        key = cell_id()
+
+    cancelled = threading.Event()
+    if key is not None:
+        with _lock:
+            previous = _loads.get(key)
+            if previous is not None:
+                previous.set()
+            _loads[key] = cancelled
+
+    def run():
+        try:
+            load(cancelled)
+        except Exception as e:
+            logger.exception("Loading the data of %s failed", type(dataviz).__name__)
+            if not cancelled.is_set():
+                dataviz.value = {**dataviz.value, "loading": False, "error": str(e)}
+        finally:
+            if key is not None:
+                with _lock:
+                    if _loads.get(key) is cancelled:
+                        del _loads[key]
+
+    return _executor.submit(run), cancelled
@@ -2,64 +2,661 @@
 # Licensed under the MIT License.
 """Functions to format data from the arrays to be used in the visualization."""
 
-import pandas as pd
-import tiledb
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
+import numpy as np
 
-def create_point_cloud(array_uri: str, bbox):
-    attrs = ["Red", "Green", "Blue"]
+from .fragments import FragmentIndex, fragment_index
+from .geometry import _MORTON_BITS, _mbr_dim_labels, _spread_bits
+from .stats import phase
 
-    with tiledb.open(array_uri) as arr:
-        data = arr.query(attrs=attrs, dims=["X", "Y", "Z"])[
+# tiledb is imported inside the functions that read arrays, importing it takes
+# a large part of the startup time of a kernel and users of from_dict never need it
+
+DEFAULT_SLICE_CACHE_BYTES = 512 * 1024**2
+
+# attributes read from a point cloud array when none are requested
+DEFAULT_POINT_CLOUD_ATTRS = ["Red", "Green", "Blue"]
+
+
+class SliceCache:
+    """LRU cache of the point cloud slices read from local arrays.
+
+    The cached columns are read-only and shared by every widget showing the
+    slice. Concurrent fetches of a slice wait for the read already in flight
+    instead of reading it again. The slices acquired by widgets are not
+    evicted while a widget holds them and are dropped when the last one
+    releases them.
+
+    :param max_bytes: budget for the cached columns, the least recently used
+        slices are evicted when it is exceeded
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_SLICE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._slices = OrderedDict()
+        # reads in flight and number of widgets holding every slice, by key
+        self._pending = {}
+        self._refs = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._slices)
+
+    def get(self, key):
+        with self._lock:
+            data = self._slices.get(key)
+            if data is not None:
+                self._slices.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        nbytes = sum(col.nbytes for col in data.values())
+        if nbytes > self.max_bytes:
+            return
+        for col in data.values():
+            # the cached columns are shared by every caller
+            col.flags.writeable = False
+        with self._lock:
+            if key in self._slices:
+                self.nbytes -= _slice_nbytes(self._slices.pop(key))
+            self._slices[key] = data
+            self.nbytes += nbytes
+            self.evict()
+
+    def fetch(self, key, read):
+        """The cached slice of the key, or the result of read() cached.
+
+        Only the first of concurrent fetches of a key calls read(), the others
+        wait for its result.
+        """
+        with self._lock:
+            data = self.get(key)
+            if data is not None:
+                return data
+            future = self._pending.get(key)
+            reading = future is None
+            if reading:
+                future = self._pending[key] = Future()
+        if not reading:
+            return future.result()
+
+        try:
+            data = read()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        for col in data.values():
+            # the columns are shared with the waiting fetches
+            col.flags.writeable = False
+        with self._lock:
+            self.put(key, data)
+            del self._pending[key]
+        future.set_result(data)
+        return data
+
+    def acquire(self, data):
+        """Keep a cached slice from being evicted while a widget shows it.
+
+        :return: key to pass to release, None when data is not a cached slice
+        """
+        with self._lock:
+            for key, cached in self._slices.items():
+                if cached is data:
+                    self._refs[key] = self._refs.get(key, 0) + 1
+                    return key
+        return None
+
+    def release(self, key):
+        """Release a slice acquired by a widget, the slice is dropped from the
+        cache once no widget holds it, so releasing the last widget frees it."""
+        with self._lock:
+            refs = self._refs.get(key, 0) - 1
+            if refs > 0:
+                self._refs[key] = refs
+                return
+            self._refs.pop(key, None)
+            data = self._slices.pop(key, None)
+            if data is not None:
+                self.nbytes -= _slice_nbytes(data)
+
+    def evict(self):
+        """Evict the least recently used slices until the cache fits in max_bytes,
+        skipping the slices held by widgets."""
+        with self._lock:
+            for key in list(self._slices):
+                if self.nbytes <= self.max_bytes:
+                    break
+                if key not in self._refs:
+                    self.nbytes -= _slice_nbytes(self._slices.pop(key))
+
+    def resize(self, max_bytes: int):
+        """Change the budget of the cache, evicting slices to fit in it."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def clear(self):
+        with self._lock:
+            self._slices.clear()
+            self._refs.clear()
+            self.nbytes = 0
+
+
+def _slice_nbytes(data):
+    return sum(col.nbytes for col in data.values())
+
+
+slice_cache = SliceCache()
+
+
+def set_slice_cache_bytes(max_bytes=None):
+    """Set the budget of the cache of the slices read from local arrays.
+
+    :param max_bytes: maximum bytes of the cached slices, 0 disables the cache
+        and None restores DEFAULT_SLICE_CACHE_BYTES. Slices shown by widgets
+        are kept until the widgets release them.
+    """
+    if max_bytes is None:
+        max_bytes = DEFAULT_SLICE_CACHE_BYTES
+    if max_bytes < 0:
+        raise ValueError("max_bytes must not be negative")
+    slice_cache.resize(int(max_bytes))
+
+
+def _arrow_column_to_numpy(column):
+    """NumPy view of a pyarrow Array or ChunkedArray, copied only when it has
+    several chunks or nulls."""
+    if hasattr(column, "num_chunks"):
+        if column.num_chunks != 1:
+            return column.to_numpy()
+        column = column.chunk(0)
+    return column.to_numpy(zero_copy_only=False)
+
+
+def point_cloud_columns(data, columns=None):
+    """Columns of a point cloud as a dict of NumPy arrays.
+
+    The points can be a dict of arrays, a pandas DataFrame, a pyarrow Table or
+    RecordBatch or a NumPy structured array. The columns are views of the
+    original buffers whenever their dtype can be used as is, they are copied
+    once otherwise.
+
+    :param columns: mapping from the names of the columns in data to the names
+        used by the visualization, e.g. {"x": "X", "intensity": "Intensity"},
+        columns that are not mapped keep their names
+    """
+    columns = columns or {}
+    module = type(data).__module__.split(".")[0]
+
+    if isinstance(data, np.ndarray) and data.dtype.names is not None:
+        names = data.dtype.names
+        # fields of a structured array are strided views
+        get = data.__getitem__
+    elif module == "pyarrow":
+        names = data.schema.names
+        get = lambda name: _arrow_column_to_numpy(data.column(name))
+    elif module == "pandas":
+        names = list(data.columns)
+        get = lambda name: data[name].to_numpy(copy=False)
+    elif isinstance(data, dict):
+        names = list(data)
+        get = lambda name: np.asarray(data[name])
+    else:
+        raise ValueError(
+            "Points must be a dict of arrays, a DataFrame, an Arrow table or a "
+            "structured array, not " + type(data).__name__
+        )
+
+    return {columns.get(name, name): get(name) for name in names}
+
+
+def _latest_write(array_uri: str):
+    """Number of fragments and timestamp of the most recent write of an array."""
+    import tiledb
+
+    fragments = tiledb.array_fragments(array_uri)
+    if len(fragments) == 0:
+        return 0, None
+    return len(fragments), max(end for _, end in fragments.timestamp_range)
+
+
+def latest_timestamp(array_uri: str):
+    """Timestamp of the most recent write of an array, None when it is empty.
+
+    Reads pinned to this timestamp followed by create_point_cloud_since or
+    create_mbrs with since set to it see every fragment exactly once.
+    """
+    return _latest_write(array_uri)[1]
+
+
+def _read_bbox(array_uri: str, bbox, attrs, timestamp=None):
+    import tiledb
+
+    with tiledb.open(array_uri, timestamp=timestamp) as arr:
+        # multi_index includes the upper bounds of the bbox, as iter_point_cloud does
+        return arr.query(attrs=attrs, dims=["X", "Y", "Z"]).multi_index[
             bbox["X"][0] : bbox["X"][1],
             bbox["Y"][0] : bbox["Y"][1],
             bbox["Z"][0] : bbox["Z"][1],
         ]
 
-    return data
-
-
-def create_mbrs(array_uri: str):
-    """Create a Dict to be passed on to BabylonMBRS to create MBRS outlines."""
-    fragments_info = tiledb.array_fragments(array_uri, include_mbrs=True)
-
-    df = pd.DataFrame()
-
-    f = 0
-    for fragment in fragments_info.mbrs:
-        f += 1
-        b = 0
-        for box in fragment:
-            b += 1
-            box_dict = {
-                "fragment": f,
-                "box": b,
-                "xmin": box[0][0],
-                "xmax": box[0][1],
-                "ymin": box[1][0],
-                "ymax": box[1][1],
-                "zmin": box[2][0],
-                "zmax": box[2][1],
-            }
-            box_df = pd.DataFrame([box_dict])
-            df = pd.concat([df, box_df], ignore_index=True)
-
-    data = {
-        "Xmin": df["xmin"],
-        "Xmax": df["xmax"],
-        "Ymin": df["ymin"],
-        "Ymax": df["ymax"],
-        "Zmin": df["zmin"],
-        "Zmax": df["zmax"],
+
+def _split_range(lo, hi, n, dtype):
+    """Split the inclusive range [lo, hi] in n disjoint inclusive ranges."""
+    if np.issubdtype(dtype, np.integer):
+        bounds = np.unique(np.linspace(lo, hi + 1, n + 1).astype(np.int64))
+        return [(int(a), int(b) - 1) for a, b in zip(bounds[:-1], bounds[1:])]
+    bounds = np.linspace(lo, hi, n + 1)
+    # all ranges but the last end just below the start of the next one
+    return [
+        (float(a), float(np.nextafter(b, -np.inf)) if i < n - 1 else float(hi))
+        for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def _read_bbox_parallel(array_uri: str, bbox, attrs, num_threads: int, timestamp=None):
+    """Read the bbox as a grid of disjoint X/Y sub-ranges on a thread pool.
+
+    TileDB releases the GIL while a query is submitted, so the sub-ranges are
+    read concurrently. Every column is copied once into the result.
+    """
+    import tiledb
+
+    with tiledb.open(array_uri) as arr:
+        domain = arr.schema.domain
+        dtypes = {dim: domain.dim(dim).dtype for dim in ["X", "Y"]}
+
+    nx = int(np.ceil(np.sqrt(num_threads)))
+    ny = int(np.ceil(num_threads / nx))
+    cells = [
+        {**bbox, "X": list(x), "Y": list(y)}
+        for x in _split_range(*bbox["X"], nx, dtypes["X"])
+        for y in _split_range(*bbox["Y"], ny, dtypes["Y"])
+    ]
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        parts = list(
+            executor.map(
+                lambda cell: _read_bbox(array_uri, cell, attrs, timestamp), cells
+            )
+        )
+
+    return OrderedDict(
+        (name, np.concatenate([part[name] for part in parts])) for name in parts[0]
+    )
+
+
+def _empty_point_cloud(array_uri: str, attrs):
+    """Columns without points, with the dtypes of the array."""
+    import tiledb
+
+    schema = tiledb.ArraySchema.load(array_uri)
+    columns = OrderedDict(
+        (dim, np.empty(0, dtype=schema.domain.dim(dim).dtype))
+        for dim in ["X", "Y", "Z"]
+    )
+    columns.update((attr, np.empty(0, dtype=schema.attr(attr).dtype)) for attr in attrs)
+    return columns
+
+
+def create_point_cloud(
+    array_uri: str,
+    bbox,
+    cache: bool = True,
+    num_threads=None,
+    attrs=None,
+    prune_fragments: bool = False,
+    timestamp=None,
+):
+    """Read the points inside the bbox.
+
+    :param cache: reuse the result of an earlier or concurrent read of the same
+        slice from the slice cache while no fragments have been added to or
+        removed from the array, the columns are then read-only
+    :param num_threads: when larger than 1, split the bbox in a grid of sub-ranges
+        read concurrently by this many threads
+    :param attrs: attributes to read besides the coordinates, defaults to the colors
+    :param prune_fragments: look up the fragments with data inside the bbox in the
+        FragmentIndex of the array, the array is not read when there are none and
+        older fragments are not opened. Building the index loads the MBRs of every
+        fragment, which only pays off for repeated reads of an array with many
+        fragments
+    :param timestamp: read the array as of this timestamp instead of the latest write
+    """
+    attrs = list(attrs or DEFAULT_POINT_CLOUD_ATTRS)
+
+    with phase("open"):
+        num_fragments, latest = _latest_write(array_uri)
+    if timestamp is None:
+        timestamp = latest
+    key = (
+        array_uri,
+        tuple(tuple(bbox[dim]) for dim in ["X", "Y", "Z"]),
+        tuple(attrs),
+        num_fragments,
+        timestamp,
+    )
+
+    def read():
+        read_timestamp = timestamp
+        if prune_fragments and num_fragments > 0:
+            with phase("open"):
+                index = fragment_index(array_uri, (num_fragments, latest))
+            # fragments without MBRs are read without pruning
+            if index is not None:
+                start = index.timestamp_start(bbox)
+                if start is None or start > timestamp:
+                    return _empty_point_cloud(array_uri, attrs)
+                read_timestamp = (start, timestamp)
+
+        # read the array as of the latest write the cache key refers to
+        with phase("query"):
+            if num_threads and num_threads > 1:
+                return _read_bbox_parallel(
+                    array_uri, bbox, attrs, num_threads, read_timestamp
+                )
+            return _read_bbox(array_uri, bbox, attrs, read_timestamp)
+
+    if cache:
+        # widgets reading the same slice at the same time share one read
+        return slice_cache.fetch(key, read)
+    return read()
+
+
+def _before(x, dtype):
+    """Largest coordinate below x."""
+    if np.issubdtype(dtype, np.integer):
+        return x - 1
+    return float(np.nextafter(x, -np.inf))
+
+
+def _after(x, dtype):
+    """Smallest coordinate above x."""
+    if np.issubdtype(dtype, np.integer):
+        return x + 1
+    return float(np.nextafter(x, np.inf))
+
+
+def _bbox_difference(bbox, previous, dtypes):
+    """Disjoint bboxes covering the part of bbox outside of previous."""
+    inter = {
+        dim: [max(bbox[dim][0], previous[dim][0]), min(bbox[dim][1], previous[dim][1])]
+        for dim in ["X", "Y", "Z"]
     }
+    if any(lo > hi for lo, hi in inter.values()):
+        return [bbox]
+
+    # peel off the slabs below and above the intersection one dimension at a time
+    boxes = []
+    rest = dict(bbox)
+    for dim in ["X", "Y", "Z"]:
+        lo, hi = rest[dim]
+        if lo < inter[dim][0]:
+            boxes.append({**rest, dim: [lo, _before(inter[dim][0], dtypes[dim])]})
+        if inter[dim][1] < hi:
+            boxes.append({**rest, dim: [_after(inter[dim][1], dtypes[dim]), hi]})
+        rest = {**rest, dim: inter[dim]}
+    return boxes
+
+
+def create_point_cloud_update(
+    array_uri: str, bbox, previous_bbox, attrs=None, timestamp=None
+):
+    """Read the points inside the bbox that are not inside previous_bbox.
+
+    Only the region of bbox outside previous_bbox is read, as at most six
+    disjoint bboxes.
+
+    :param timestamp: read the array as of this timestamp instead of the latest write
+    """
+    import tiledb
+
+    attrs = list(attrs or DEFAULT_POINT_CLOUD_ATTRS)
+
+    with tiledb.open(array_uri) as arr:
+        domain = arr.schema.domain
+        dtypes = {dim: domain.dim(dim).dtype for dim in ["X", "Y", "Z"]}
+
+    with phase("query"):
+        parts = [
+            _read_bbox(array_uri, box, attrs, timestamp)
+            for box in _bbox_difference(bbox, previous_bbox, dtypes)
+        ]
+    if not parts:
+        # bbox is inside previous_bbox
+        return _empty_point_cloud(array_uri, attrs)
+    return OrderedDict(
+        (name, np.concatenate([part[name] for part in parts])) for name in parts[0]
+    )
+
+
+def create_point_cloud_since(array_uri: str, bbox, since, until=None, attrs=None):
+    """Read the points inside the bbox written after the timestamp since.
+
+    Only the fragments written after since are opened, with a TileDB timestamp
+    range, and the array is not read when none of their non empty domains
+    intersects the bbox. Their MBRs are not loaded, so refreshing does not
+    depend on the number of fragments written before.
+
+    :param since: timestamp of the previous read, see latest_timestamp
+    :param until: timestamp of the latest write to read, defaults to the latest write
+    """
+    import tiledb
+
+    attrs = list(attrs or DEFAULT_POINT_CLOUD_ATTRS)
+
+    with phase("open"):
+        fragments = tiledb.array_fragments(array_uri)
+    if until is None and len(fragments) > 0:
+        until = max(end for _, end in fragments.timestamp_range)
+    start = 0 if since is None else since + 1
+    if until is None or until < start:
+        return _empty_point_cloud(array_uri, attrs)
+
+    new = [
+        domain
+        for domain, (begin, end) in zip(
+            fragments.nonempty_domain, fragments.timestamp_range
+        )
+        if begin >= start and end <= until
+    ]
+    if not any(
+        all(
+            lo <= bbox[dim][1] and bbox[dim][0] <= hi
+            for dim, (lo, hi) in zip(["X", "Y", "Z"], domain)
+        )
+        for domain in new
+    ):
+        return _empty_point_cloud(array_uri, attrs)
+
+    with phase("query"):
+        return _read_bbox(array_uri, bbox, attrs, (start, until))
 
-    extents = [
-        min(df["xmin"].tolist()),
-        max(df["xmax"].tolist()),
-        min(df["ymin"].tolist()),
-        max(df["ymax"].tolist()),
-        min(df["zmin"].tolist()),
-        max(df["zmax"].tolist()),
+
+def iter_point_cloud(
+    array_uri: str, bbox, buffer_size: int, attrs=None, timestamp=None
+):
+    """Read the points inside the bbox in batches.
+
+    The query is resubmitted while it is incomplete so at most one batch of
+    buffer_size bytes per column is held in memory at any time.
+
+    :param timestamp: read the array as of this timestamp instead of the latest write
+    """
+    import tiledb
+
+    attrs = list(attrs or DEFAULT_POINT_CLOUD_ATTRS)
+    ctx = tiledb.Ctx(tiledb.Config({"py.init_buffer_bytes": int(buffer_size)}))
+
+    with phase("open"):
+        arr = tiledb.open(array_uri, ctx=ctx, timestamp=timestamp)
+    with arr:
+        query = arr.query(attrs=attrs, dims=["X", "Y", "Z"], return_incomplete=True)
+        for batch in query.multi_index[
+            bbox["X"][0] : bbox["X"][1],
+            bbox["Y"][0] : bbox["Y"][1],
+            bbox["Z"][0] : bbox["Z"][1],
+        ]:
+            yield batch
+
+
+def downsample_point_cloud(data, point_budget: int, method: str = "voxel", seed=None):
+    """Reduce a point cloud to at most point_budget points before it is sent to the browser.
+
+    :param data: dictionary with the columns of the points, including "X", "Y" and "Z"
+    :param point_budget: maximum number of points to return
+    :param method: "voxel" replaces the points in every voxel by their average position
+        and color, using the finest octree grid that fits the budget with the densest
+        voxels split once more, other attributes such as classifications are taken
+        from the first point of the voxel, "random" keeps a uniform random sample
+    :param seed: seed for the random sample
+    """
+    n = data["X"].size
+    if n <= point_budget:
+        return data
+
+    if method == "random":
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(n, size=point_budget, replace=False))
+        return {key: np.asarray(col)[rows] for key, col in data.items()}
+    if method != "voxel":
+        raise ValueError("Unknown downsampling method: " + method)
+
+    # sort the points along a Morton curve so that the points of every voxel of every
+    # octree level are contiguous and voxels can be counted without sorting again
+    xyz = [np.asarray(data[dim], dtype=np.float64) for dim in ["X", "Y", "Z"]]
+    lo = [c.min() for c in xyz]
+    size = max(max(c.max() for c in xyz) - l for c, l in zip(xyz, lo)) or 1.0
+    scale = ((1 << _MORTON_BITS) - 1) / size
+    codes = _spread_bits(((xyz[0] - lo[0]) * scale).astype(np.uint64))
+    codes |= _spread_bits(((xyz[1] - lo[1]) * scale).astype(np.uint64)) << np.uint64(1)
+    codes |= _spread_bits(((xyz[2] - lo[2]) * scale).astype(np.uint64)) << np.uint64(2)
+    order = np.argsort(codes)
+    codes = codes[order]
+
+    def voxel_starts(level):
+        ids = codes >> np.uint64(3 * (_MORTON_BITS - level))
+        return np.concatenate([[True], ids[1:] != ids[:-1]])
+
+    # finest level that fits the budget
+    level = 0
+    starts = voxel_starts(0)
+    while level < _MORTON_BITS:
+        finer = voxel_starts(level + 1)
+        if np.count_nonzero(finer) > point_budget:
+            break
+        level, starts = level + 1, finer
+
+    # fill the rest of the budget by splitting the voxels with the most points
+    if level < _MORTON_BITS:
+        finer = voxel_starts(level + 1)
+        parent = np.cumsum(starts) - 1
+        points = np.bincount(parent)
+        children = np.bincount(parent, weights=finer)
+        by_points = np.argsort(-points, kind="stable")
+        extra = np.cumsum(children[by_points] - 1)
+        split = np.zeros(points.size, dtype=bool)
+        split[by_points[extra <= point_budget - points.size]] = True
+        starts = starts | (finer & split[parent])
+
+    inverse = np.cumsum(starts) - 1
+    counts = np.bincount(inverse)
+    downsampled = {}
+    first = np.minimum.reduceat(order, np.flatnonzero(starts))
+    for key, col in data.items():
+        col = np.asarray(col)
+        if key not in ["X", "Y", "Z", "Red", "Green", "Blue"]:
+            # averages of categorical attributes are meaningless
+            downsampled[key] = col[first]
+            continue
+        mean = np.bincount(inverse, weights=col[order]) / counts
+        if np.issubdtype(col.dtype, np.integer):
+            mean = np.rint(mean)
+        downsampled[key] = mean.astype(col.dtype)
+    return downsampled
+
+
+def create_mbrs(array_uri: str, box_budget=None, bbox=None, since=None, until=None):
+    """Create a Dict to be passed on to BabylonMBRS to create MBRS outlines.
+
+    :param box_budget: maximum number of boxes, neighbouring MBRs are merged
+        hierarchically with FragmentIndex.aggregate when there are more
+    :param bbox: only show the MBRs intersecting this bbox, to drill into a
+        region with finer boxes, requires box_budget or since
+    :param since: only show the MBRs of the fragments written after this
+        timestamp, the box budget then applies to these fragments alone
+    :param until: only show the fragments written up to this timestamp
+    :return: None when since is set and there are no new MBRs inside the bbox
+    """
+    if since is not None:
+        # only the new fragments are indexed, not the whole array again
+        with phase("open"):
+            index = FragmentIndex._read(array_uri, start=since + 1, end=until)
+        if index is None:
+            return None
+        bounds, _ = index.aggregate(box_budget or len(index), bbox)
+        if bounds.shape[0] == 0:
+            return None
+        return _mbrs_dict(bounds, index.labels)
+
+    if box_budget is not None:
+        with phase("open"):
+            index = fragment_index(array_uri, _latest_write(array_uri))
+        if index is not None and until is not None:
+            index = index.written_between(0, until)
+        if index is None:
+            raise ValueError("Array " + array_uri + " does not contain any MBRs")
+        bounds, _ = index.aggregate(box_budget, bbox)
+        if bounds.shape[0] == 0:
+            raise ValueError("Array " + array_uri + " has no MBRs inside the bbox")
+        return _mbrs_dict(bounds, index.labels)
+
+    import tiledb
+
+    with phase("open"):
+        fragments_info = tiledb.array_fragments(array_uri, include_mbrs=True)
+    fragments = [
+        np.asarray(fragment)
+        for fragment, (_, end) in zip(
+            fragments_info.mbrs, fragments_info.timestamp_range
+        )
+        if until is None or end <= until
     ]
+    fragments = [fragment for fragment in fragments if fragment.size > 0]
+
+    if not fragments:
+        raise ValueError("Array " + array_uri + " does not contain any MBRs")
+
+    # every fragment is an array of shape (boxes, dims, 2) with the min and max per dim
+    ndim = fragments[0].shape[1]
+    nboxes = sum(fragment.shape[0] for fragment in fragments)
+    dtype = np.result_type(*fragments)
+
+    bounds = np.empty((nboxes, ndim, 2), dtype=dtype)
+    start = 0
+    for fragment in fragments:
+        bounds[start : start + fragment.shape[0]] = fragment
+        start += fragment.shape[0]
+
+    return _mbrs_dict(bounds, _mbr_dim_labels(array_uri, ndim))
+
+
+def _mbrs_dict(bounds, labels):
+    """Columns and extents of MBRs from an array of shape (boxes, dims, 2)."""
+    mins = bounds[:, :, 0].min(axis=0).tolist()
+    maxs = bounds[:, :, 1].max(axis=0).tolist()
+
+    data = {}
+    extents = []
+    for d, label in enumerate(labels):
+        data[label + "min"] = bounds[:, d, 0]
+        data[label + "max"] = bounds[:, d, 1]
+        extents += [mins[d], maxs[d]]
 
     return dict(extents=extents, data=data)
@@ -0,0 +1,148 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Export of widgets to static HTML pages."""
+
+import os
+from base64 import standard_b64encode
+
+import numpy as np
+
+from .args import check_point_cloud_data_budget
+from .data import create_point_cloud
+from .serializers import value_to_json
+
+# alignment of the columns in a sidecar file, enough for every TypedArray
+_ALIGNMENT = 8
+
+
+def _export_data(widget):
+    """All the points shown by a widget, including the points appended after
+    its value was set by update_bbox or refresh, which are only kept in the
+    frontend. These are read again and downsampled to the point budget."""
+    value = widget.value
+    octree = getattr(widget, "octree", None)
+    if octree is not None:
+        nodes = [
+            data for _, data in octree.traverse(value.get("point_budget"), None, ())
+        ]
+        if not nodes:
+            return {}
+        return {
+            name: np.concatenate([node[name] for node in nodes]) for name in nodes[0]
+        }
+    bbox = getattr(widget, "bbox", None)
+    appended = value.get("buffer_size") or bbox or getattr(widget, "refreshed", False)
+    if value.get("source") == "local" and appended:
+        data = create_point_cloud(
+            value["uri"],
+            bbox or value["bbox"],
+            attrs=value.get("attributes"),
+            timestamp=getattr(widget, "timestamp", None),
+        )
+        # downsampled like the points shown
+        return check_point_cloud_data_budget(
+            data, value, getattr(widget, "sampling", "voxel")
+        )
+    return value.get("data") or {}
+
+
+def _write_sidecar(datas, path):
+    """Write the buffers of the encoded columns of every data dictionary to a
+    binary file and replace them by the position of the column in the file."""
+    src = os.path.basename(path)
+    with open(path, "wb") as f:
+        for data in datas:
+            for name, col in data.items():
+                buffer = col["buffer"]
+                f.write(b"\0" * (-f.tell() % _ALIGNMENT))
+                offset = f.tell()
+                f.write(buffer)
+                data[name] = {
+                    **{key: v for key, v in col.items() if key != "buffer"},
+                    "src": src,
+                    "byte_offset": offset,
+                    "byte_length": buffer.nbytes,
+                }
+
+
+def export_html(
+    widget, path: str, sidecar=False, quantize=None, compression=None, title=None
+):
+    """Write a static HTML page showing the widget without a kernel.
+
+    The columns are embedded in the page as base64 binary buffers, or with
+    sidecar=True written to a binary file next to the page that the page
+    fetches when it is opened. The page needs to be served over HTTP to fetch a
+    sidecar file. The TileDB Cloud token of the widget is never exported.
+
+    :param widget: BabylonPointCloud, BabylonMBRS or BabylonScene widget
+    :param path: path of the HTML file, the sidecar file gets the extension .bin
+    :param sidecar: write the columns to a separate binary file
+    :param quantize: quantize the coordinates and colors, see Show.point_cloud,
+        defaults to the setting of the widget
+    :param compression: compress the columns, see Show.point_cloud, defaults to
+        the setting of the widget
+    :param title: title of the page
+    """
+    from ipywidgets.embed import dependency_state, embed_minimal_html
+
+    if getattr(widget, "released", False):
+        raise ValueError(
+            "The data of the widget has been released and cannot be exported"
+        )
+
+    value = {key: v for key, v in widget.value.items() if key != "token"}
+    if "layers" not in value:
+        value["data"] = _export_data(widget)
+    # the page cannot request more points from the kernel
+    value["streaming"] = False
+    if quantize is not None:
+        value["quantize"] = quantize
+    if compression is not None:
+        value["compression"] = compression
+
+    encoded = value_to_json(value, None)
+    # the data of a scene is kept by its layers
+    if "layers" in encoded:
+        datas = [
+            (["value", "layers", i, "data"], layer["data"])
+            for i, layer in enumerate(encoded["layers"])
+        ]
+    else:
+        datas = [(["value", "data"], encoded["data"])]
+
+    buffers = []
+    if sidecar:
+        _write_sidecar([data for _, data in datas], os.path.splitext(path)[0] + ".bin")
+    else:
+        for prefix, data in datas:
+            for name, col in data.items():
+                buffers.append(
+                    {
+                        "encoding": "base64",
+                        "path": prefix + [name, "buffer"],
+                        "data": standard_b64encode(col["buffer"]).decode("ascii"),
+                    }
+                )
+                data[name] = {key: v for key, v in col.items() if key != "buffer"}
+
+    state = dependency_state([widget.layout])
+    state[widget.model_id] = {
+        "model_name": widget._model_name,
+        "model_module": widget._model_module,
+        "model_module_version": widget._model_module_version,
+        "state": {
+            **widget.get_state(key=[key for key in widget.keys if key != "value"]),
+            "value": encoded,
+        },
+    }
+    if buffers:
+        state[widget.model_id]["buffers"] = buffers
+
+    embed_minimal_html(
+        path,
+        views=[widget],
+        state=state,
+        title=title or type(widget).__name__,
+        indent=None,
+    )
@@ -0,0 +1,285 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Spatial index over the MBRs of the fragments of a sparse array."""
+
+import threading
+
+import numpy as np
+
+from .geometry import _MORTON_BITS, _mbr_dim_labels, _spread_bits
+
+
+class FragmentIndex:
+    """Packed R-tree over the minimum bounding rectangles of the data tiles of
+    every fragment of a sparse array.
+
+    The MBRs are sorted along a Morton curve of their centres and grouped in
+    nodes of node_size entries, level by level up to a single root, so a bbox
+    query only tests the nodes intersecting the bbox instead of every MBR.
+
+    :param bounds: array of shape (mbrs, dims, 2) with the min and max per dimension
+    :param fragment: index of the fragment of every MBR
+    :param cell_num: number of cells of every fragment
+    :param timestamp_range: (start, end) timestamps of every fragment
+    :param labels: labels of the dimensions, used as the keys of bboxes
+    :param node_size: number of entries per node of the tree
+    :param capacity: maximum number of cells of a data tile, bounds max_points
+    """
+
+    def __init__(
+        self,
+        bounds,
+        fragment,
+        cell_num,
+        timestamp_range,
+        labels,
+        node_size=16,
+        capacity=None,
+    ):
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.fragment = np.asarray(fragment, dtype=np.int64)
+        self.cell_num = np.asarray(cell_num, dtype=np.int64)
+        self.timestamp_range = np.asarray(timestamp_range, dtype=np.int64).reshape(
+            -1, 2
+        )
+        self.labels = list(labels)
+        self.node_size = node_size
+        self.capacity = capacity
+
+        # the cells of a fragment are spread evenly over its MBRs for estimates
+        mbrs_per_fragment = np.bincount(self.fragment, minlength=self.cell_num.size)
+        self.cells = self.cell_num[self.fragment] / np.maximum(
+            mbrs_per_fragment[self.fragment], 1
+        )
+
+        self._build()
+
+    @classmethod
+    def from_array(cls, array_uri: str, node_size=16):
+        index = cls._read(array_uri, node_size)
+        if index is None:
+            raise ValueError("Array " + array_uri + " does not contain any MBRs")
+        return index
+
+    @classmethod
+    def _read(cls, array_uri, node_size=16, start=0, end=None):
+        """FragmentIndex of the fragments of an array written within the inclusive
+        timestamp range, None when these fragments have no MBRs."""
+        import tiledb
+
+        fragments_info = tiledb.array_fragments(array_uri, include_mbrs=True)
+        mbrs = [
+            (
+                np.asarray(fragment, dtype=np.float64)
+                if begin >= start and (end is None or last <= end)
+                else np.empty((0, 0, 2))
+            )
+            for fragment, (begin, last) in zip(
+                fragments_info.mbrs, fragments_info.timestamp_range
+            )
+        ]
+        ndim = next((m.shape[1] for m in mbrs if m.size > 0), 0)
+        if ndim == 0:
+            return None
+
+        bounds = np.concatenate([m for m in mbrs if m.size > 0])
+        fragment = np.repeat(np.arange(len(mbrs)), [m.shape[0] for m in mbrs])
+        return cls(
+            bounds,
+            fragment,
+            fragments_info.cell_num,
+            fragments_info.timestamp_range,
+            _mbr_dim_labels(array_uri, ndim),
+            node_size,
+            tiledb.ArraySchema.load(array_uri).capacity,
+        )
+
+    def __len__(self):
+        return self.bounds.shape[0]
+
+    @staticmethod
+    def _morton(bounds):
+        """Morton codes of the centres of boxes along their first three dimensions."""
+        centres = bounds[:, :3].mean(axis=2)
+        lo = centres.min(axis=0)
+        size = np.maximum(centres.max(axis=0) - lo, 1e-300)
+        cells = ((centres - lo) / size * ((1 << _MORTON_BITS) - 1)).astype(np.uint64)
+        codes = np.zeros(bounds.shape[0], dtype=np.uint64)
+        for d in range(cells.shape[1]):
+            codes |= _spread_bits(cells[:, d]) << np.uint64(d)
+        return codes
+
+    def _build(self):
+        self.order = np.argsort(self._morton(self.bounds), kind="stable")
+
+        # levels of node bounds from the leaves to the root
+        self.levels = [self.bounds[self.order]]
+        while self.levels[-1].shape[0] > 1:
+            below = self.levels[-1]
+            starts = np.arange(0, below.shape[0], self.node_size)
+            self.levels.append(self._merge(below, starts)[0])
+
+    def _box(self, bbox):
+        """Bounds of a bbox dictionary, unbounded along dimensions it does not contain."""
+        box = np.empty((len(self.labels), 2))
+        box[:, 0] = -np.inf
+        box[:, 1] = np.inf
+        for d, label in enumerate(self.labels):
+            if label in bbox:
+                box[d] = bbox[label]
+        return box
+
+    def query(self, bbox):
+        """Indices of the MBRs intersecting the bbox, ranges are inclusive."""
+        box = self._box(bbox)
+        nodes = np.zeros(1, dtype=np.int64)
+        for depth in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[depth]
+            if depth < len(self.levels) - 1:
+                # entries of the nodes that intersected at the level above
+                nodes = (
+                    nodes[:, None] * self.node_size + np.arange(self.node_size)
+                ).ravel()
+                nodes = nodes[nodes < level.shape[0]]
+            candidates = level[nodes]
+            hits = np.all(
+                (candidates[:, :, 0] <= box[:, 1]) & (box[:, 0] <= candidates[:, :, 1]),
+                axis=1,
+            )
+            nodes = nodes[hits]
+        return np.sort(self.order[nodes])
+
+    def fragments(self, bbox):
+        """Indices of the fragments with data inside the bbox."""
+        return np.unique(self.fragment[self.query(bbox)])
+
+    def estimate(self, bbox):
+        """Estimated number of points inside the bbox, assuming the points of every
+        MBR are spread uniformly over it."""
+        mbrs = self.query(bbox)
+        box = self._box(bbox)
+        bounds = self.bounds[mbrs]
+        width = bounds[:, :, 1] - bounds[:, :, 0]
+        overlap = np.minimum(bounds[:, :, 1], box[:, 1]) - np.maximum(
+            bounds[:, :, 0], box[:, 0]
+        )
+        fraction = np.where(width > 0, overlap / np.where(width > 0, width, 1), 1.0)
+        return float(np.sum(self.cells[mbrs] * np.prod(fraction, axis=1)))
+
+    def max_points(self, bbox):
+        """Upper bound of the number of points inside the bbox, every MBR
+        intersecting it holds at most capacity points of its fragment."""
+        mbrs = self.query(bbox)
+        per_fragment = np.bincount(self.fragment[mbrs], minlength=self.cell_num.size)
+        if self.capacity is None:
+            # without a capacity every MBR holds all the points of its fragment
+            return int(self.cell_num[per_fragment > 0].sum())
+        return int(np.minimum(per_fragment * self.capacity, self.cell_num).sum())
+
+    def aggregate(self, box_budget: int, bbox=None):
+        """Bounds of at most box_budget boxes covering the MBRs intersecting the bbox.
+
+        When there are more MBRs than box_budget, neighbouring MBRs of the same
+        fragment are merged, the same number of MBRs per box in every fragment.
+        When even one box per fragment does not fit, the boxes of the fragments
+        are merged in turn along the Morton curve of their centres.
+
+        :return: array of shape (boxes, dims, 2) and the number of MBRs per box
+        """
+        mbrs = self.query(bbox) if bbox is not None else np.arange(len(self))
+        if mbrs.size <= box_budget:
+            return self.bounds[mbrs], np.ones(mbrs.size, dtype=np.int64)
+
+        # neighbouring MBRs of a fragment are contiguous in fragment and Morton order
+        rank = np.empty(len(self), dtype=np.int64)
+        rank[self.order] = np.arange(len(self))
+        mbrs = mbrs[np.lexsort((rank[mbrs], self.fragment[mbrs]))]
+        fragment = self.fragment[mbrs]
+        fragment_starts = np.flatnonzero(
+            np.concatenate([[True], fragment[1:] != fragment[:-1]])
+        )
+        sizes = np.diff(np.append(fragment_starts, mbrs.size))
+
+        if fragment_starts.size <= box_budget:
+            # smallest number of MBRs per box that fits in the budget
+            lo, hi = 1, int(sizes.max())
+            while lo < hi:
+                k = (lo + hi) // 2
+                if np.sum(-(-sizes // k)) <= box_budget:
+                    hi = k
+                else:
+                    lo = k + 1
+            position = np.arange(mbrs.size) - np.repeat(fragment_starts, sizes)
+            starts = np.flatnonzero(position % lo == 0)
+            return self._merge(self.bounds[mbrs], starts)
+
+        # one box per fragment, merged along the Morton curve of their centres
+        boxes, counts = self._merge(self.bounds[mbrs], fragment_starts)
+        order = np.argsort(self._morton(boxes), kind="stable")
+        k = -(-boxes.shape[0] // box_budget)
+        merged, _ = self._merge(boxes[order], np.arange(0, boxes.shape[0], k))
+        return merged, np.add.reduceat(counts[order], np.arange(0, boxes.shape[0], k))
+
+    @staticmethod
+    def _merge(bounds, starts):
+        """Union of the runs of boxes beginning at starts and their sizes."""
+        merged = np.stack(
+            [
+                np.minimum.reduceat(bounds[:, :, 0], starts),
+                np.maximum.reduceat(bounds[:, :, 1], starts),
+            ],
+            axis=2,
+        )
+        return merged, np.diff(np.append(starts, bounds.shape[0]))
+
+    def timestamp_start(self, bbox):
+        """Start of the timestamp range covering every fragment with data inside the
+        bbox, None when there are none."""
+        fragments = self.fragments(bbox)
+        if fragments.size == 0:
+            return None
+        return int(self.timestamp_range[fragments, 0].min())
+
+    def written_between(self, start, end=None):
+        """FragmentIndex of the MBRs of the fragments written within the inclusive
+        timestamp range, None when there are none.
+
+        The fragments are the ones TileDB opens for this timestamp range.
+        """
+        written = self.timestamp_range[:, 0] >= start
+        if end is not None:
+            written &= self.timestamp_range[:, 1] <= end
+        mbrs = np.flatnonzero(written[self.fragment])
+        if mbrs.size == 0:
+            return None
+        return FragmentIndex(
+            self.bounds[mbrs],
+            self.fragment[mbrs],
+            self.cell_num,
+            self.timestamp_range,
+            self.labels,
+            self.node_size,
+            self.capacity,
+        )
+
+
+# FragmentIndex of the latest version of every array, by URI
+_indexes = {}
+_lock = threading.Lock()
+
+
+def fragment_index(array_uri: str, version=None):
+    """FragmentIndex of an array, rebuilt when the version changes.
+
+    :param version: value identifying the fragments of the array, such as the
+        number of fragments and the timestamp of the latest write
+    :return: None when the fragments have no MBRs, their reads are not pruned
+    """
+    with _lock:
+        cached = _indexes.get(array_uri)
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
+    index = FragmentIndex._read(array_uri)
+    with _lock:
+        _indexes[array_uri] = (version, index)
+    return index
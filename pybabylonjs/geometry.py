@@ -0,0 +1,30 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Morton codes and MBR labels shared by the data and fragments modules."""
+
+import numpy as np
+
+_MORTON_BITS = 21
+
+
+def _spread_bits(v):
+    """Insert two zero bits between the lowest 21 bits of every value."""
+    v = v & np.uint64(0x1FFFFF)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1F00000000FFFF)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1F0000FF0000FF)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100F00F00F00F00F)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+
+def _mbr_dim_labels(array_uri: str, ndim: int):
+    """Labels of the MBR columns: X, Y and Z for the first three dimensions
+    followed by the dimension names of the array for any further dimensions."""
+    import tiledb
+
+    labels = ["X", "Y", "Z"][:ndim]
+    if ndim > len(labels):
+        domain = tiledb.ArraySchema.load(array_uri).domain
+        labels += [domain.dim(d).name for d in range(len(labels), ndim)]
+    return labels
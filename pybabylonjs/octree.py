@@ -0,0 +1,220 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Level of detail octree for streaming local point cloud arrays."""
+
+from collections import deque
+
+import numpy as np
+
+from .data import iter_point_cloud
+from .plan import batch_size, estimate_point_cloud
+from .stats import phase
+
+DEFAULT_POINT_BUDGET = 1_000_000
+
+
+def _point_hash(data):
+    """Deterministic pseudo random number in [0, 1) for every point, from its coordinates."""
+    h = np.zeros(data["X"].size, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for dim in ["X", "Y", "Z"]:
+            bits = np.ascontiguousarray(data[dim], dtype=np.float64).view(np.uint64)
+            # splitmix64 finalizer
+            h = h ^ bits
+            h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            h = h ^ (h >> np.uint64(31))
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class PointCloudOctree:
+    """Octree of sampled nodes over a local TileDB point cloud array.
+
+    Every point is assigned to exactly one level, with the expected number of
+    points per node equal to node_size, so the nodes are disjoint and the points
+    of a node add detail to the points of its ancestors. The levels are derived
+    from a hash of the coordinates and nodes are read lazily from the array, in
+    batches of buffer_size bytes per column. Reading a node scans its region and
+    also fills the cache for its descendants up to cache_depth levels below it,
+    only the points of these levels are kept.
+
+    :param array_uri: URI of the local TileDB array
+    :param bbox: region of the array to index, defaults to the non empty domain
+    :param node_size: expected number of points per node
+    :param cache_depth: number of levels below a node that are cached when it is read
+    :param buffer_size: bytes per column of the batches read, defaults to the
+        batches of a read within the default memory budget
+    :param attrs: attributes to read besides the coordinates, defaults to the colors
+    """
+
+    ROOT = (0, 0, 0, 0)
+
+    def __init__(
+        self,
+        array_uri: str,
+        bbox=None,
+        node_size: int = 50_000,
+        cache_depth: int = 2,
+        buffer_size=None,
+        attrs=None,
+    ):
+        self.array_uri = array_uri
+        self.node_size = node_size
+        self.cache_depth = cache_depth
+        self.buffer_size = buffer_size or batch_size(attrs=attrs)
+        self.attrs = attrs
+
+        import tiledb
+
+        with phase("open"):
+            with tiledb.open(array_uri) as arr:
+                if bbox is None:
+                    bbox = dict(zip(["X", "Y", "Z"], arr.nonempty_domain()))
+        self.bounds = np.array([bbox[dim] for dim in ["X", "Y", "Z"]], dtype=np.float64)
+
+        # estimated without reading, the points outside the bbox are not indexed
+        points, _ = estimate_point_cloud(array_uri, bbox, attrs)
+        self.num_points = max(int(points), 1)
+        self.max_depth = self._level(np.array([1.0]))[0]
+
+        self._nodes = {}
+
+    def _level(self, u):
+        """Level of points with hash u, the density of the sample increases 8 times per level."""
+        ratio = np.maximum(u * self.num_points / self.node_size, 1.0)
+        return np.where(
+            u * self.num_points < self.node_size,
+            0,
+            np.floor(np.log(ratio) / np.log(8)).astype(np.int64) + 1,
+        )
+
+    def _cells(self, data, depth):
+        """Index of the node containing every point at the given depth."""
+        n = 2**depth
+        cells = []
+        for i, dim in enumerate(["X", "Y", "Z"]):
+            lo, hi = self.bounds[i]
+            size = (hi - lo) / n if hi > lo else 1.0
+            cells.append(np.clip(((data[dim] - lo) // size).astype(np.int64), 0, n - 1))
+        return cells
+
+    def node_bbox(self, key):
+        """Bounding box of a node, keys are (depth, ix, iy, iz) tuples."""
+        depth, *index = key
+        n = 2**depth
+        bbox = {}
+        for i, dim in enumerate(["X", "Y", "Z"]):
+            lo, hi = self.bounds[i]
+            size = (hi - lo) / n
+            bbox[dim] = [lo + index[i] * size, lo + (index[i] + 1) * size]
+        return bbox
+
+    @staticmethod
+    def children(key):
+        depth, ix, iy, iz = key
+        return [
+            (depth + 1, 2 * ix + dx, 2 * iy + dy, 2 * iz + dz)
+            for dx in (0, 1)
+            for dy in (0, 1)
+            for dz in (0, 1)
+        ]
+
+    @staticmethod
+    def parent(key):
+        depth, ix, iy, iz = key
+        return (depth - 1, ix // 2, iy // 2, iz // 2)
+
+    def _read(self, key):
+        """Read the region of a node and cache it and its descendants up to cache_depth."""
+        depth = key[0]
+        last = min(depth + self.cache_depth, self.max_depth)
+        bbox = self.node_bbox(key)
+
+        batches = iter_point_cloud(self.array_uri, bbox, self.buffer_size, self.attrs)
+
+        parts = {}
+        counts = {}
+        for batch in batches:
+            # ranges are inclusive, drop points on the border that belong to a neighbour
+            cells = self._cells(batch, depth)
+            inside = np.logical_and.reduce([c == i for c, i in zip(cells, key[1:])])
+            batch = {name: col[inside] for name, col in batch.items()}
+            levels = self._level(_point_hash(batch))
+
+            for d in range(depth, last + 1):
+                n = 2**d
+                ix, iy, iz = self._cells(batch, d)
+                ids = (ix * n + iy) * n + iz
+                for i, count in zip(*np.unique(ids, return_counts=True)):
+                    node = (d, int(i) // (n * n), int(i) // n % n, int(i) % n)
+                    counts[node] = counts.get(node, 0) + int(count)
+
+                # points of deeper levels are read again when those nodes are needed
+                selected = np.flatnonzero(levels == d)
+                selected = selected[np.argsort(ids[selected], kind="stable")]
+                uniques, starts = np.unique(ids[selected], return_index=True)
+                ends = np.append(starts[1:], selected.size)
+                for i, start, end in zip(uniques, starts, ends):
+                    node = (d, int(i) // (n * n), int(i) // n % n, int(i) % n)
+                    rows = selected[start:end]
+                    parts.setdefault(node, []).append(
+                        {name: col[rows] for name, col in batch.items()}
+                    )
+
+        for node, count in counts.items():
+            data = parts.get(node, [])
+            self._nodes[node] = {
+                "count": count,
+                "data": {
+                    name: np.concatenate([part[name] for part in data])
+                    for name in (data[0] if data else [])
+                },
+            }
+            if node[0] < last:
+                for child in self.children(node):
+                    self._nodes.setdefault(child, {"count": 0, "data": {}})
+        self._nodes.setdefault(key, {"count": 0, "data": {}})
+
+    def node(self, key):
+        """Points of a node and the total number of points inside its region."""
+        if key not in self._nodes:
+            # the siblings are usually needed next, read them together with the parent
+            self._read(self.parent(key) if key[0] > 0 else key)
+        node = self._nodes[key]
+        return node["data"], node["count"]
+
+    def traverse(self, point_budget=None, bbox=None, exclude=()):
+        """Yield (key, data) of the nodes breadth first until the point budget is used.
+
+        :param point_budget: maximum number of points to yield
+        :param bbox: only yield nodes intersecting this bbox
+        :param exclude: keys of the nodes that have been yielded before, these
+            still count towards the point budget
+        """
+        if point_budget is None:
+            point_budget = DEFAULT_POINT_BUDGET
+
+        used = 0
+        queue = deque([self.ROOT])
+        while queue:
+            key = queue.popleft()
+            if bbox is not None and not self._intersects(key, bbox):
+                continue
+            data, count = self.node(key)
+            if count == 0:
+                continue
+            size = data["X"].size if data else 0
+            if used + size > point_budget:
+                return
+            used += size
+            if key not in exclude and size > 0:
+                yield key, data
+            if key[0] < self.max_depth:
+                queue.extend(self.children(key))
+
+    def _intersects(self, key, bbox):
+        node_bbox = self.node_bbox(key)
+        return all(
+            node_bbox[dim][0] <= bbox[dim][1] and bbox[dim][0] <= node_bbox[dim][1]
+            for dim in ["X", "Y", "Z"]
+        )
@@ -0,0 +1,193 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Estimates of the size of point cloud reads and plans keeping them within a memory budget."""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .data import (
+    DEFAULT_POINT_CLOUD_ATTRS,
+    _empty_point_cloud,
+    _latest_write,
+    create_point_cloud,
+    downsample_point_cloud,
+    iter_point_cloud,
+)
+from .fragments import fragment_index
+from .stats import phase
+
+DEFAULT_MEMORY_BUDGET = 1024**3
+
+# batches of chunked reads are copied while they are encoded and sent
+_BATCH_COPIES = 4
+_MIN_BUFFER_SIZE = 1024**2
+
+
+class ReadPlan:
+    """Expected size of reading the points inside a bbox and how to read them
+    without exceeding a memory budget.
+
+    The strategy is "read" when the points fit in the budget, "chunked" to read
+    and send them in batches of buffer_size bytes per column, or "sample" to
+    read them in batches and keep point_budget points in total.
+
+    :param points: estimated number of points inside the bbox
+    :param nbytes: estimated size of the columns of these points
+    :param memory_budget: maximum number of bytes held by the read
+    """
+
+    def __init__(
+        self,
+        points: int,
+        nbytes: int,
+        memory_budget: int,
+        strategy: str = "read",
+        buffer_size=None,
+        point_budget=None,
+    ):
+        self.points = points
+        self.nbytes = nbytes
+        self.memory_budget = memory_budget
+        self.strategy = strategy
+        self.buffer_size = buffer_size
+        self.point_budget = point_budget
+
+    def __repr__(self):
+        plan = f"ReadPlan: {self.points} points, {self.nbytes} bytes, {self.strategy}"
+        if self.strategy == "chunked":
+            plan += f" in batches of {self.buffer_size} bytes per column"
+        elif self.strategy == "sample":
+            plan += f" {self.point_budget} points"
+        return plan
+
+
+def batch_size(memory_budget=None, attrs=None):
+    """Bytes per column of the batches of a read holding at most memory_budget bytes."""
+    memory_budget = int(memory_budget or DEFAULT_MEMORY_BUDGET)
+    columns = 3 + len(attrs or DEFAULT_POINT_CLOUD_ATTRS)
+    return max(memory_budget // (columns * _BATCH_COPIES), _MIN_BUFFER_SIZE)
+
+
+def estimate_point_cloud(array_uri: str, bbox, attrs=None, timestamp=None):
+    """Estimated number of points inside the bbox and bytes per point, without
+    reading them.
+
+    The larger of the result size estimate of TileDB and the upper bound from
+    the MBRs of the fragments intersecting the bbox is used, so the plan does
+    not exceed the memory budget. Fragments without MBRs only have the TileDB
+    estimate, which assumes the points of a data tile are spread uniformly over it.
+    """
+    import tiledb
+
+    attrs = list(attrs or DEFAULT_POINT_CLOUD_ATTRS)
+
+    with tiledb.open(array_uri, timestamp=timestamp) as arr:
+        schema = arr.schema
+        itemsizes = OrderedDict(
+            (dim, schema.domain.dim(dim).dtype.itemsize) for dim in ["X", "Y", "Z"]
+        )
+        itemsizes.update((attr, schema.attr(attr).dtype.itemsize) for attr in attrs)
+        # an incomplete query is only submitted when it is iterated
+        query = arr.query(attrs=attrs, dims=["X", "Y", "Z"], return_incomplete=True)
+        sizes = query.multi_index[
+            bbox["X"][0] : bbox["X"][1],
+            bbox["Y"][0] : bbox["Y"][1],
+            bbox["Z"][0] : bbox["Z"][1],
+        ].estimated_result_sizes()
+    points = sizes["X"].data_bytes // itemsizes["X"]
+
+    num_fragments, latest = _latest_write(array_uri)
+    if num_fragments > 0:
+        index = fragment_index(array_uri, (num_fragments, latest))
+        if index is not None and timestamp is not None:
+            # the fragments TileDB opens at this timestamp
+            index = index.written_between(0, timestamp)
+        if index is not None:
+            points = max(points, index.max_points(bbox))
+
+    return points, sum(itemsizes.values())
+
+
+def plan_point_cloud(
+    array_uri: str,
+    bbox,
+    attrs=None,
+    memory_budget=None,
+    point_budget=None,
+    timestamp=None,
+):
+    """Plan the read of the points inside the bbox within a memory budget.
+
+    :param memory_budget: maximum number of bytes held by the read, defaults to
+        DEFAULT_MEMORY_BUDGET
+    :param point_budget: maximum number of points shown, larger reads are
+        sampled down to it instead of read in full
+    :return: ReadPlan
+    """
+    memory_budget = int(memory_budget or DEFAULT_MEMORY_BUDGET)
+    with phase("open"):
+        points, point_bytes = estimate_point_cloud(array_uri, bbox, attrs, timestamp)
+    nbytes = points * point_bytes
+    if nbytes <= memory_budget:
+        return ReadPlan(points, nbytes, memory_budget)
+
+    buffer_size = batch_size(memory_budget, attrs)
+    if point_budget is not None and point_budget < points:
+        # the sample itself has to fit in the budget as well
+        point_budget = int(min(point_budget, memory_budget // point_bytes))
+        return ReadPlan(
+            points, nbytes, memory_budget, "sample", buffer_size, point_budget
+        )
+    return ReadPlan(points, nbytes, memory_budget, "chunked", buffer_size)
+
+
+def read_point_cloud(
+    array_uri: str,
+    bbox,
+    plan: ReadPlan,
+    attrs=None,
+    sampling="voxel",
+    timestamp=None,
+    num_threads=None,
+):
+    """Read the points inside the bbox as planned.
+
+    :param sampling: downsampling method of a sample plan, see downsample_point_cloud
+    :param num_threads: threads reading the bbox of a plan reading it at once
+    :return: the columns of the points, or an iterator of batches of columns
+        for a chunked plan
+    """
+    if plan.strategy == "read":
+        return create_point_cloud(
+            array_uri, bbox, num_threads=num_threads, attrs=attrs, timestamp=timestamp
+        )
+
+    batches = iter_point_cloud(array_uri, bbox, plan.buffer_size, attrs, timestamp)
+    if plan.strategy == "chunked":
+        return batches
+    if plan.strategy != "sample":
+        raise ValueError("Unknown read strategy: " + plan.strategy)
+
+    # every batch keeps its share of the point budget
+    fraction = plan.point_budget / max(plan.points, 1)
+    parts = []
+    while True:
+        with phase("query"):
+            batch = next(batches, None)
+        if batch is None:
+            break
+        n = batch["X"].size
+        if n > 0:
+            budget = max(int(np.ceil(n * fraction)), 1)
+            with phase("sample"):
+                parts.append(downsample_point_cloud(batch, budget, sampling))
+    if not parts:
+        return _empty_point_cloud(array_uri, list(attrs or DEFAULT_POINT_CLOUD_ATTRS))
+
+    data = OrderedDict(
+        (name, np.concatenate([part[name] for part in parts])) for name in parts[0]
+    )
+    # the estimate can be lower than the number of points read
+    with phase("sample"):
+        return downsample_point_cloud(data, plan.point_budget, sampling)
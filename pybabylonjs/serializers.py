@@ -0,0 +1,249 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Binary (de)serialization of the widget state sent over the comm."""
+
+import zlib
+
+import numpy as np
+
+from .stats import phase
+
+# NumPy dtypes with a matching JavaScript TypedArray in the frontend
+TYPED_ARRAY_DTYPES = (
+    "int8",
+    "uint8",
+    "int16",
+    "uint16",
+    "int32",
+    "uint32",
+    "float32",
+    "float64",
+)
+
+DEFAULT_PRECISION = 0.001
+
+# codecs of compressed buffers, deflate is decoded natively by browsers
+COMPRESSION_CODECS = ("deflate",)
+
+# columns smaller than this are not worth compressing
+MIN_COMPRESSED_BYTES = 1024
+
+
+def array_to_json(arr):
+    """Wrap an array as a contiguous binary buffer with its dtype and shape.
+
+    ipywidgets sends any memoryview in the state as a separate binary buffer,
+    so the values never go through JSON encoding.
+    """
+    arr = np.asarray(arr)
+    if arr.dtype.name not in TYPED_ARRAY_DTYPES:
+        # 64-bit integers and other dtypes have no widely supported TypedArray
+        arr = arr.astype(np.float64)
+    arr = np.ascontiguousarray(arr)
+    return {
+        "dtype": arr.dtype.name,
+        "shape": list(arr.shape),
+        "buffer": memoryview(arr.reshape(-1)),
+    }
+
+
+def array_from_json(value):
+    """Inverse of array_to_json, quantize_array and compress_array."""
+    buffer = value["buffer"]
+    if value.get("compression") == "deflate":
+        buffer = zlib.decompress(buffer)
+    arr = np.frombuffer(buffer, dtype=value["dtype"])
+    if "scale" in value:
+        arr = value["offset"] + arr * value["scale"]
+    return arr.reshape(value["shape"])
+
+
+def quantize_array(arr, precision, origin=None):
+    """Encode coordinates as unsigned integer offsets from the origin with a scale factor.
+
+    The values are stored as uint16 when the range fits in 65536 steps of the
+    given precision and as uint32 otherwise, with a coarser precision when even
+    that does not fit.
+    """
+    arr = np.asarray(arr, dtype=np.float64)
+    lo = arr.min() if arr.size else 0.0
+    offset = lo if origin is None else min(float(origin), lo)
+    extent = (arr.max() if arr.size else offset) - offset
+
+    # the maximum is rounded like every value, it must not wrap around
+    if np.rint(extent / precision) <= np.iinfo(np.uint16).max:
+        dtype = np.uint16
+    else:
+        dtype = np.uint32
+        precision = max(precision, extent / np.iinfo(np.uint32).max)
+
+    steps = np.clip(np.rint((arr - offset) / precision), 0, np.iinfo(dtype).max)
+    encoded = array_to_json(steps.astype(dtype))
+    return {**encoded, "scale": float(precision), "offset": float(offset)}
+
+
+def quantize_colors(arr, rgb_max=None):
+    """Scale color values to uint8, rgb_max defaults to the maximum of 8 or 16 bit colors.
+
+    16 bit colors are assumed to use the full range up to 65535, colors stored
+    as 8 bit values in a 16 bit attribute, as in some LAS files, need rgb_max=255.
+    """
+    arr = np.asarray(arr)
+    if rgb_max is None:
+        rgb_max = 255 if arr.dtype.itemsize == 1 else 65535
+    scaled = np.rint(np.clip(arr, 0, rgb_max) * (255 / rgb_max)).astype(np.uint8)
+    return array_to_json(scaled)
+
+
+def compress_array(encoded, codec):
+    """Compress the buffer of an encoded array, unless that does not make it smaller."""
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    buffer = encoded["buffer"]
+    if buffer.nbytes < MIN_COMPRESSED_BYTES:
+        return encoded
+    # the fastest level, most of the gain comes from the repeated high bytes of the values
+    compressed = zlib.compress(buffer, 1)
+    if len(compressed) >= buffer.nbytes:
+        return encoded
+    return {**encoded, "buffer": memoryview(compressed), "compression": codec}
+
+
+def encoding(value):
+    """Options for a quantized or compressed encoding of the points of a widget,
+    None when neither is enabled."""
+    quantize = value.get("quantize")
+    compression = value.get("compression")
+    if not quantize and not compression:
+        return None
+    if compression is True:
+        compression = COMPRESSION_CODECS[0]
+    bbox = value.get("bbox") or {}
+    return {
+        "precision": (
+            None
+            if not quantize
+            else DEFAULT_PRECISION if quantize is True else float(quantize)
+        ),
+        "origin": {dim: bbox[dim][0] for dim in ["X", "Y", "Z"] if dim in bbox},
+        "rgb_max": value.get("rgb_max"),
+        "compression": compression or None,
+    }
+
+
+def encode_column(key, col, encoding=None):
+    """Encode a column, quantized and compressed as set by the encoding options."""
+    if encoding is None:
+        return array_to_json(col)
+    if encoding["precision"] is not None and key in ["X", "Y", "Z"]:
+        encoded = quantize_array(
+            col, encoding["precision"], encoding["origin"].get(key)
+        )
+    elif encoding["precision"] is not None and key in ["Red", "Green", "Blue"]:
+        encoded = quantize_colors(col, encoding["rgb_max"])
+    else:
+        encoded = array_to_json(col)
+    if encoding["compression"] is not None:
+        encoded = compress_array(encoded, encoding["compression"])
+    return encoded
+
+
+def _is_array(value):
+    return isinstance(value, np.ndarray) or hasattr(value, "__array__")
+
+
+def _is_encoded_array(value):
+    return isinstance(value, dict) and {"dtype", "shape", "buffer"} <= value.keys()
+
+
+def data_to_json(data, encoding=None):
+    """Encode every column of a data dictionary as a binary buffer."""
+    if data is None:
+        return None
+    return {
+        key: encode_column(key, col, encoding) if _is_array(col) else col
+        for key, col in data.items()
+    }
+
+
+def data_from_json(data):
+    """Decode every binary column of a data dictionary."""
+    if data is None:
+        return None
+    return {
+        key: array_from_json(col) if _is_encoded_array(col) else col
+        for key, col in data.items()
+    }
+
+
+def data_to_buffers(data, encoding=None):
+    """Split a data dictionary into column descriptions and binary buffers,
+    to be sent as a custom message with the buffers in the same order."""
+    columns = []
+    buffers = []
+    for key, col in data.items():
+        encoded = encode_column(key, col, encoding)
+        buffers.append(encoded.pop("buffer"))
+        columns.append({"name": key, **encoded})
+    return columns, buffers
+
+
+def _encoded_size(value):
+    """Number of points or boxes and bytes of the binary columns of an encoded
+    value, including the layers of a scene."""
+    rows, nbytes = 0, 0
+    for layer in value.get("layers") or []:
+        layer_rows, layer_nbytes = _encoded_size(layer)
+        rows += layer_rows
+        nbytes += layer_nbytes
+    data = value.get("data")
+    if isinstance(data, dict):
+        columns = [col for col in data.values() if _is_encoded_array(col)]
+        if columns:
+            rows += int(np.prod(columns[0]["shape"]))
+            nbytes += sum(col["buffer"].nbytes for col in columns)
+    return rows, nbytes
+
+
+def _encode_value(value):
+    if isinstance(value.get("layers"), list):
+        # the layers of a scene are encoded with the options of the scene
+        options = {key: value.get(key) for key in ["quantize", "compression"]}
+        layers = [_encode_value({**layer, **options}) for layer in value["layers"]]
+        value = {**value, "layers": layers}
+    if "data" not in value or not isinstance(value["data"], dict):
+        return value
+
+    with phase("encode"):
+        options = encoding(value)
+        data = data_to_json(value["data"], options)
+    if options is None or options["precision"] is None:
+        return {**value, "data": data}
+    # colors are sent scaled to 8 bits
+    return {**value, "data": data, "rgb_max": 255}
+
+
+def value_to_json(value, widget):
+    """Serialize the value trait of a widget, sending `data` as binary buffers.
+
+    The size of the encoded data is kept in widget.encoded_size, the stats
+    count it once per value set with BabylonBase.set_value rather than every
+    time the value is synced to a view.
+    """
+    encoded = _encode_value(value)
+    if widget is not None:
+        widget.encoded_size = _encoded_size(encoded)
+    return encoded
+
+
+def value_from_json(value, widget):
+    """Deserialize the value trait of a widget."""
+    if isinstance(value.get("layers"), list):
+        layers = [value_from_json(layer, widget) for layer in value["layers"]]
+        value = {**value, "layers": layers}
+    if "data" not in value or not isinstance(value["data"], dict):
+        return value
+    return {**value, "data": data_from_json(value["data"])}
+
+
+value_serialization = {"to_json": value_to_json, "from_json": value_from_json}
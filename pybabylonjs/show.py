@@ -4,17 +4,93 @@
 """Classes for setting up the visualization."""
 
 from IPython.display import display
-from typing import Optional
+from typing import Callable, Optional
 from enum import Enum
 
 from .args import *
+from .background import load_in_background
+from .stats import LoadStats, phase
 from .data import *
-from .babylonjs import BabylonPointCloud, BabylonMBRS, BabylonImage
+from .babylonjs import BabylonPointCloud, BabylonMBRS, BabylonImage, BabylonScene
+from .tiles import DEFAULT_TILE_SIZE, ImageTileServer
 
 
-def create_dataviz(dataviz, d, **kwargs):
-    dataviz.value = {**d, **kwargs}
+def create_dataviz(dataviz, d, stats=None, **kwargs):
+    if stats is not None:
+        dataviz.stats = stats
+    dataviz.set_value({**d, **kwargs})
     display(dataviz)
+    dataviz.stats.done()
+
+
+def _load_point_cloud(dataviz, d, streaming, sampling, cancelled=None, on_loaded=None):
+    """Read the points of a "dict" or "local" point cloud and send them to the widget.
+
+    :param cancelled: threading.Event, when set no more data is sent to the widget
+    :param on_loaded: called with the widget once its value is set
+
+    The timings are recorded in dataviz.stats, which is reported when the load is done.
+    """
+    stats = dataviz.stats
+    dataviz.sampling = sampling
+    with stats.activate():
+        batches = None
+        octree = None
+
+        if d["source"] == "dict":
+            data = check_point_cloud_data_budget(d["data"], d, sampling)
+        elif streaming:
+            # stream the nodes of an octree built on the local array
+            octree = check_point_cloud_data_local_streaming(d["uri"], d)
+            data, _ = octree.node(octree.ROOT)
+        else:
+            # pinned to the latest write, BabylonPointCloud.refresh reads the later ones
+            with phase("open"):
+                dataviz.timestamp = latest_timestamp(d["uri"])
+            data = check_point_cloud_data_local(
+                d["uri"], d, dataviz.timestamp, sampling
+            )
+            if not isinstance(data, dict):
+                # chunked read: show the first batch and append the others as they arrive
+                batches = data
+                with phase("query"):
+                    data = next(batches, {})
+            else:
+                data = check_point_cloud_data_budget(data, d, sampling)
+                # the slice is shared with the other widgets showing it
+                dataviz.slice_key = slice_cache.acquire(data)
+
+        if cancelled is not None and cancelled.is_set():
+            return
+
+        # the nodes of an octree are sent over the comm, the frontend does not fetch them itself
+        dataviz.set_value(
+            {
+                **d,
+                "data": data,
+                "streaming": streaming and octree is None,
+                "octree": octree is not None,
+            }
+        )
+        if on_loaded is not None:
+            on_loaded(dataviz)
+
+        if batches is not None:
+            while True:
+                with phase("query"):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                if cancelled is not None and cancelled.is_set():
+                    return
+                dataviz.append(batch)
+        if octree is not None:
+            dataviz.octree = octree
+            dataviz.sent_nodes.add(octree.ROOT)
+            dataviz.send_nodes(d.get("point_budget"))
+
+    if cancelled is None or not cancelled.is_set():
+        stats.done()
 
 
 class PyBabylonJSError(Exception):
@@ -29,7 +105,10 @@ class ImageFeatureType(Enum):
 
 
 class Show:
-    """Create a N-D visualization."""
+    """Create a N-D visualization.
+
+    Every method displays the widget it creates and returns it.
+    """
 
     def __init__(self):
         self._value = None
@@ -42,6 +121,11 @@ class Show:
         source: Optional[str] = "cloud",
         streaming: Optional[bool] = False,
         data: Optional[dict] = {},
+        sampling: Optional[str] = "voxel",
+        asynchronous: Optional[bool] = False,
+        on_stats: Optional[Callable] = None,
+        columns: Optional[dict] = None,
+        release_data: Optional[bool] = False,
         **kwargs,
     ):
         """
@@ -49,25 +133,43 @@ class Show:
 
         :param uri: when source is "cloud" or "local" specify the URI for the TileDB array
         :param source: location of the data to be visualized, one of "cloud", "local" or "dict"
-        :param streaming: when true all data will be streamed from the TileDB array
-        :param data: when source="dict" this dictionary contains the points to be visualized: {"X", "Y", "Z", "Red", "Green", "Blue"}
+        :param streaming: when true all data will be streamed from the TileDB array, for source="local" from an octree built in Python
+        :param data: when source="dict" the points to be visualized with the columns {"X", "Y", "Z", "Red", "Green", "Blue"}, as a dict of arrays, a pandas DataFrame, a pyarrow Table or a NumPy structured array
+        :param columns: mapping from the column names of data to the names used by the visualization, e.g. {"x": "X", "y": "Y", "z": "Z"}
+        :param sampling: when source is "dict" or "local" and point_budget is set, the points are downsampled to the budget before they are sent with "voxel" averaging or a "random" sample
+        :param asynchronous: when source is "dict" or "local" display the widget immediately and read the data on a background thread, a load started before from the same notebook cell is cancelled
+        :param quantize: when true or a precision, coordinates are sent as 16 or 32 bit integers with this precision (default 0.001) and colors as 8 bit integers scaled from the range up to rgb_max
+        :param compression: "deflate" or True to compress the columns sent to the visualization
+        :param buffer_size: when source="local" read the bbox in batches of this many bytes per attribute, the batches are added to the visualization as they are read
+        :param attributes: attributes of the points to read and send besides the coordinates, by default the colors "Red", "Green" and "Blue"
+        :param color_by: attribute mapped to the colors of the points through color_ramp, by default the first attribute when attributes has no colors
+        :param color_ramp: color ramp used with color_by, "viridis" (default), "grayscale" or "categorical"
+        :param on_stats: called with the LoadStats of the widget, with the time spent per phase and the points and bytes sent, when the data is loaded
+        :param memory_budget: when source="local" the maximum number of bytes held by the read, the size of the read is estimated first and larger reads are sampled down to the point_budget or read in batches (default 1 GiB)
+        :param release_data: drop the points from the widget in the kernel once the frontend has received them, the widget then cannot be exported and a reloaded page shows no points
 
         """
 
+        stats = LoadStats("BabylonPointCloud", on_stats)
         point_cloud_args_in = kwargs
 
-        if source == "dict":
-            data = check_point_cloud_data_dict(data)
-        if source == "local":
-            data = check_point_cloud_data_local(uri, point_cloud_args_in)
-        if source == "cloud":
-            point_cloud_args_in = check_point_cloud_data_cloud(
-                streaming, uri, point_cloud_args_in
+        with stats.phase("validate"):
+            if source == "cloud":
+                point_cloud_args_in = check_point_cloud_data_cloud(
+                    streaming, uri, point_cloud_args_in
+                )
+
+            point_cloud_args = check_point_cloud_args(
+                source, streaming, point_cloud_args_in
             )
 
-        point_cloud_args = check_point_cloud_args(
-            source, streaming, point_cloud_args_in
-        )
+            if source == "dict":
+                data = check_point_cloud_data_dict(
+                    data,
+                    point_cloud_args.get("attributes"),
+                    point_cloud_args.get("color_by"),
+                    columns,
+                )
 
         d = {
             **point_cloud_args,
@@ -78,21 +180,48 @@ class Show:
         }
 
         dataviz = BabylonPointCloud()
-        dataviz.value = {**d}
-        display(dataviz)
+        dataviz.stats = stats
+        dataviz.release_data = release_data
+
+        if source == "cloud":
+            create_dataviz(dataviz, d)
+        elif asynchronous:
+            dataviz.value = {**d, "data": {}, "loading": True}
+            display(dataviz)
+            load_in_background(
+                dataviz,
+                lambda cancelled: _load_point_cloud(
+                    dataviz, d, streaming, sampling, cancelled
+                ),
+            )
+        else:
+            _load_point_cloud(dataviz, d, streaming, sampling, on_loaded=display)
+        return dataviz
 
     @classmethod
     def from_dict(
         self,
-        data: dict,
+        data,
         uri: Optional[str] = None,
+        sampling: Optional[str] = "voxel",
+        on_stats: Optional[Callable] = None,
+        columns: Optional[dict] = None,
+        release_data: Optional[bool] = False,
         **kwargs,
     ):
         source = "dict"
+        stats = LoadStats("BabylonPointCloud", on_stats)
 
-        data = check_point_cloud_data_dict(data)
+        with stats.activate(), phase("validate"):
+            point_cloud_args = check_point_cloud_args(source, False, kwargs)
 
-        point_cloud_args = check_point_cloud_args(False, kwargs)
+            data = check_point_cloud_data_dict(
+                data,
+                point_cloud_args.get("attributes"),
+                point_cloud_args.get("color_by"),
+                columns,
+            )
+            data = check_point_cloud_data_budget(data, point_cloud_args, sampling)
 
         d = {
             **point_cloud_args,
@@ -103,32 +232,132 @@ class Show:
         }
 
         dataviz = BabylonPointCloud()
-        dataviz.value = {**d}
-        display(dataviz)
+        dataviz.release_data = release_data
+        create_dataviz(dataviz, d, stats)
+        return dataviz
+
+    @classmethod
+    def scene(
+        self,
+        layers: list,
+        sampling: Optional[str] = "voxel",
+        on_stats: Optional[Callable] = None,
+        release_data: Optional[bool] = False,
+        **kwargs,
+    ):
+        """
+        Returns a visualization widget showing several point clouds and MBRs in one scene
+
+        The layers share one canvas and WebGL context and can be shown and hidden
+        with the checkboxes of the widget or BabylonScene.set_visible without
+        sending their data again.
+
+        :param layers: list of dicts with the "name" of a layer, its "kind",
+            "point_cloud" (default) or "mbrs", "visible" and optionally a "color"
+            [r, g, b] painting the whole layer in 8 bit colors. A point cloud layer
+            has a "source", "dict" (default) with its "data" and "columns" or "local"
+            with its "uri" and "bbox", and optionally a "point_budget" and "rgb_max".
+            An MBRs layer has the "uri" of the array and optionally a "box_budget"
+            and "bbox" as Show.mbrs
+        :param sampling: downsampling method of the point cloud layers with a point_budget
+        :param edge_points: number of points drawn along every edge of the MBRs (default 16)
+        :param on_stats: called with the LoadStats of the widget when the layers are loaded
+        :param release_data: drop the data of the layers from the widget in the kernel once the frontend has received it, see Show.point_cloud
+
+        The other arguments are the display arguments of Show.point_cloud.
+        """
+        stats = LoadStats("BabylonScene", on_stats)
+        edge_points = kwargs.pop("edge_points", None)
+
+        with stats.activate(), phase("validate"):
+            point_cloud_args = check_point_cloud_args("dict", False, kwargs)
+            layers = [
+                check_scene_layer(layer, i, sampling) for i, layer in enumerate(layers)
+            ]
+        names = [layer["name"] for layer in layers]
+        if len(set(names)) < len(names):
+            raise ValueError("The names of the layers are not unique")
+
+        d = {
+            **point_cloud_args,
+            "layers": layers,
+            "edge_points": edge_points,
+            "source": "dict",
+        }
+        dataviz = BabylonScene()
+        dataviz.release_data = release_data
+        create_dataviz(dataviz, d, stats)
+        return dataviz
 
     @classmethod
     def image(
         self,
+        uri: Optional[str] = None,
+        source: Optional[str] = "cloud",
         **kwargs,
     ):
+        """
+        Returns an image visualization widget
+
+        :param uri: when source="local" the URI of the image array or of the group of its resolution levels
+        :param source: location of the image, "cloud" or "local", a local image is drawn on a 2D canvas that pans and zooms with the mouse
+        :param tile_size: when source="local" the size of the tiles sent to the visualization in pixels
+        :param num_threads: when source="local" the number of tiles read concurrently
+        """
         image_args = check_image_args(kwargs)
 
         # d = {**image_args}
 
         # d = create_image(array_uri, **kwargs)
         dataviz = BabylonImage()
+        if source == "local":
+            dataviz.tile_server = ImageTileServer(
+                uri,
+                tile_size=image_args.pop("tile_size", None) or DEFAULT_TILE_SIZE,
+                num_threads=image_args.pop("num_threads", None),
+            )
+            image_args = {
+                **image_args,
+                **dataviz.tile_server.metadata(),
+                "uri": uri,
+                "source": source,
+            }
         dataviz.value = {**image_args}
         display(dataviz)
         # create_dataviz(BabylonImage(), **image_args)
+        return dataviz
 
     @classmethod
     def mbrs(
         self,
         array_uri: str,
+        box_budget: Optional[int] = None,
+        on_stats: Optional[Callable] = None,
+        release_data: Optional[bool] = False,
         **kwargs,
     ):
-        d = create_mbrs(array_uri)
-        create_dataviz(BabylonMBRS(), d, **kwargs)
+        """
+        Returns a visualization widget of the MBRs of the fragments of an array
+
+        :param array_uri: URI of the TileDB array
+        :param box_budget: maximum number of boxes shown, neighbouring MBRs are merged hierarchically when the array has more, BabylonMBRS.drill shows finer boxes inside a bbox and the budget can be changed in the visualization
+        :param compression: "deflate" or True to compress the columns sent to the visualization
+        :param on_stats: called with the LoadStats of the widget when the MBRs are loaded
+        :param release_data: drop the MBRs from the widget in the kernel once the frontend has received them, see Show.point_cloud
+
+        BabylonMBRS.refresh adds the outlines of the fragments written afterwards.
+        """
+        stats = LoadStats("BabylonMBRS", on_stats)
+        with stats.activate():
+            with phase("open"):
+                timestamp = latest_timestamp(array_uri)
+            d = create_mbrs(array_uri, box_budget, until=timestamp)
+        d = {**d, "uri": array_uri, "box_budget": box_budget}
+        dataviz = BabylonMBRS()
+        dataviz.timestamp = timestamp
+        dataviz.release_data = release_data
+        create_dataviz(dataviz, d, stats, **kwargs)
+        return dataviz
 
 
 class BabylonJS:
@@ -0,0 +1,119 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Timings and sizes of the data loaded into a widget."""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# phases of loading the data of a widget, in the order they happen
+PHASES = ("open", "query", "validate", "sample", "encode", "sync")
+
+_current = contextvars.ContextVar("pybabylonjs_stats", default=None)
+
+
+class LoadStats:
+    """Time spent per phase, points and bytes sent while loading the data of a widget.
+
+    Nested phases are exclusive: the time spent encoding a value while it is
+    synced only counts towards "encode".
+
+    :param name: name of the widget in the log messages
+    :param callback: called with the stats when the load is done
+    """
+
+    def __init__(self, name: str = "widget", callback=None):
+        self.name = name
+        self.callback = callback
+        self.timings = {}
+        self.points = 0
+        self.bytes_sent = 0
+        self.messages = 0
+        self._stack = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Count the time spent in the with block towards a phase."""
+        now = time.perf_counter()
+        with self._lock:
+            if self._stack:
+                outer = self._stack[-1]
+                self._add(outer[0], now - outer[1])
+            self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            with self._lock:
+                name, start = self._stack.pop()
+                self._add(name, now - start)
+                if self._stack:
+                    self._stack[-1][1] = now
+
+    def _add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def record_sent(self, points: int, nbytes: int):
+        """Count a message sent to the frontend."""
+        with self._lock:
+            self.points += points
+            self.bytes_sent += nbytes
+            self.messages += 1
+
+    @contextmanager
+    def activate(self):
+        """Make these the stats of the phases entered with phase() in the with block."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def done(self):
+        """Log the stats and call the callback."""
+        logger.info("%s", self)
+        if self.callback is not None:
+            self.callback(self)
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        return {
+            "timings": dict(self.timings),
+            "total": self.total,
+            "points": self.points,
+            "bytes_sent": self.bytes_sent,
+            "messages": self.messages,
+        }
+
+    def __repr__(self):
+        timings = ", ".join(
+            f"{name} {self.timings[name]:.3f}s"
+            for name in sorted(self.timings, key=_phase_order)
+        )
+        return (
+            f"{self.name}: {self.points} points, {self.bytes_sent} bytes in "
+            f"{self.messages} messages, {self.total:.3f}s ({timings})"
+        )
+
+
+def _phase_order(name):
+    return PHASES.index(name) if name in PHASES else len(PHASES)
+
+
+@contextmanager
+def phase(name: str):
+    """Count the time spent in the with block towards a phase of the active stats."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    with stats.phase(name):
+        yield
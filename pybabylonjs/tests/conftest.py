@@ -4,7 +4,11 @@
 # Copyright (c) TileDB, Inc..
 # Distributed under the terms of the Modified BSD License.
 
+import numpy as np
 import pytest
+import tiledb
+
+import pybabylonjs.show
 
 from ipykernel.comm import Comm
 from ipywidgets import Widget
@@ -57,3 +61,54 @@ def mock_comm():
             delattr(Widget, attr)
         else:
             setattr(Widget, attr, value)
+
+
+def create_points_array(uri, fragments=3, points=100, seed=0):
+    rng = np.random.default_rng(seed)
+    dims = [
+        tiledb.Dim(name=name, domain=(0.0, 1000.0), tile=100.0, dtype=np.float64)
+        for name in ["X", "Y", "Z"]
+    ]
+    attrs = [
+        tiledb.Attr(name=name, dtype=np.uint16) for name in ["Red", "Green", "Blue"]
+    ]
+    schema = tiledb.ArraySchema(
+        domain=tiledb.Domain(*dims),
+        attrs=attrs,
+        sparse=True,
+        capacity=10,
+        allows_duplicates=True,
+    )
+    tiledb.Array.create(uri, schema)
+
+    for _ in range(fragments):
+        xyz = rng.uniform(0, 1000, size=(3, points))
+        colors = rng.integers(0, 65535, size=(3, points), dtype=np.uint16)
+        with tiledb.open(uri, "w") as arr:
+            arr[xyz[0], xyz[1], xyz[2]] = {
+                "Red": colors[0],
+                "Green": colors[1],
+                "Blue": colors[2],
+            }
+    return uri
+
+
+@pytest.fixture
+def points_array(tmp_path):
+    return create_points_array(str(tmp_path / "points"))
+
+
+def custom_msg(content, buffers=()):
+    """Comm message of a custom message sent by the frontend."""
+    return {
+        "content": {"data": {"method": "custom", "content": content}},
+        "buffers": list(buffers),
+    }
+
+
+@pytest.fixture
+def widgets(monkeypatch):
+    """The widgets displayed by Show, which are not displayed in the tests."""
+    displayed = []
+    monkeypatch.setattr(pybabylonjs.show, "display", displayed.append)
+    return displayed
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import tiledb
+
+import pybabylonjs.data
+import pybabylonjs.fragments
+from pybabylonjs.data import (
+    DEFAULT_SLICE_CACHE_BYTES,
+    SliceCache,
+    create_mbrs,
+    create_point_cloud,
+    create_point_cloud_since,
+    create_point_cloud_update,
+    downsample_point_cloud,
+    iter_point_cloud,
+    latest_timestamp,
+    point_cloud_columns,
+    set_slice_cache_bytes,
+    slice_cache,
+)
+
+BBOX = {"X": [100, 800], "Y": [0, 500], "Z": [200, 1000]}
+
+
+def test_iter_point_cloud(points_array):
+    data = create_point_cloud(points_array, BBOX)
+    batches = list(iter_point_cloud(points_array, BBOX, buffer_size=256))
+
+    assert len(batches) > 1
+    assert all(batch["X"].nbytes <= 256 for batch in batches)
+    for key in ["X", "Y", "Z", "Red", "Green", "Blue"]:
+        np.testing.assert_array_equal(
+            np.sort(np.concatenate([batch[key] for batch in batches])),
+            np.sort(data[key]),
+        )
+
+
+@pytest.mark.parametrize("num_threads", [2, 5])
+def test_create_point_cloud_parallel(points_array, num_threads):
+    data = create_point_cloud(points_array, BBOX, cache=False)
+    parallel = create_point_cloud(
+        points_array, BBOX, cache=False, num_threads=num_threads
+    )
+
+    order = np.argsort(data["X"])
+    parallel_order = np.argsort(parallel["X"])
+    for key in ["X", "Y", "Z", "Red", "Green", "Blue"]:
+        np.testing.assert_array_equal(data[key][order], parallel[key][parallel_order])
+
+
+@pytest.mark.parametrize(
+    "bbox",
+    [
+        {"X": [300, 900], "Y": [0, 400], "Z": [150, 1000]},
+        {"X": [200, 300], "Y": [100, 200], "Z": [300, 400]},
+        {"X": [850, 1000], "Y": [0, 500], "Z": [200, 1000]},
+    ],
+)
+def test_create_point_cloud_update(points_array, bbox):
+    previous = create_point_cloud(points_array, BBOX, cache=False)
+    update = create_point_cloud_update(points_array, bbox, BBOX)
+    expected = create_point_cloud(points_array, bbox, cache=False)
+
+    def inside(data, bbox):
+        return np.logical_and.reduce(
+            [(data[d] >= bbox[d][0]) & (data[d] <= bbox[d][1]) for d in "XYZ"]
+        )
+
+    assert not inside(update, BBOX).any()
+    kept = inside(previous, bbox)
+    for key in ["X", "Y", "Z", "Red", "Green", "Blue"]:
+        np.testing.assert_array_equal(
+            np.sort(np.concatenate([previous[key][kept], update[key]])),
+            np.sort(expected[key]),
+        )
+
+
+def write_points(uri, timestamp, points=20, seed=1):
+    rng = np.random.default_rng(seed)
+    xyz = rng.uniform(0, 1000, size=(3, points))
+    colors = rng.integers(0, 65535, size=(3, points), dtype=np.uint16)
+    with tiledb.open(uri, "w", timestamp=timestamp) as arr:
+        arr[xyz[0], xyz[1], xyz[2]] = dict(zip(["Red", "Green", "Blue"], colors))
+
+
+def test_create_point_cloud_since(points_array):
+    since = latest_timestamp(points_array)
+    previous = create_point_cloud(points_array, BBOX, cache=False, timestamp=since)
+    assert create_point_cloud_since(points_array, BBOX, since)["X"].size == 0
+
+    write_points(points_array, since + 1)
+    new = create_point_cloud_since(points_array, BBOX, since)
+    expected = create_point_cloud(points_array, BBOX, cache=False)
+    assert new["X"].size > 0
+    for key in ["X", "Y", "Z", "Red", "Green", "Blue"]:
+        np.testing.assert_array_equal(
+            np.sort(np.concatenate([previous[key], new[key]])),
+            np.sort(expected[key]),
+        )
+
+    # a read pinned to the first timestamp does not see the new fragment
+    pinned = create_point_cloud(points_array, BBOX, timestamp=since)
+    assert pinned["X"].size == previous["X"].size
+
+
+def test_create_point_cloud_since_outside_bbox(points_array, monkeypatch):
+    since = latest_timestamp(points_array)
+    with tiledb.open(points_array, "w", timestamp=since + 1) as arr:
+        arr[np.array([900.0]), np.array([900.0]), np.array([900.0])] = {
+            "Red": np.array([1], dtype=np.uint16),
+            "Green": np.array([2], dtype=np.uint16),
+            "Blue": np.array([3], dtype=np.uint16),
+        }
+
+    def read(*args):
+        raise AssertionError("the array is read")
+
+    # the new fragment does not intersect the bbox, neither the array nor the
+    # MBRs of its fragments are read
+    monkeypatch.setattr(pybabylonjs.data, "_read_bbox", read)
+    monkeypatch.setattr(pybabylonjs.fragments.FragmentIndex, "_read", read)
+    bbox = {"X": [0, 100], "Y": [0, 100], "Z": [0, 100]}
+    assert create_point_cloud_since(points_array, bbox, since)["X"].size == 0
+
+
+def test_create_point_cloud_attrs(points_array):
+    data = create_point_cloud(points_array, BBOX, attrs=["Green"])
+    assert list(data) == ["X", "Y", "Z", "Green"]
+    np.testing.assert_array_equal(
+        np.sort(data["Green"]), np.sort(create_point_cloud(points_array, BBOX)["Green"])
+    )
+
+
+def test_create_point_cloud_cache(points_array):
+    slice_cache.clear()
+    data = create_point_cloud(points_array, BBOX)
+    assert create_point_cloud(points_array, BBOX) is data
+    assert not data["X"].flags.writeable
+    assert create_point_cloud(points_array, BBOX, cache=False) is not data
+
+    # a new fragment invalidates the cached slice
+    with tiledb.open(points_array, "w") as arr:
+        arr[np.array([500.0]), np.array([250.0]), np.array([500.0])] = {
+            "Red": np.array([1], dtype=np.uint16),
+            "Green": np.array([1], dtype=np.uint16),
+            "Blue": np.array([1], dtype=np.uint16),
+        }
+    updated = create_point_cloud(points_array, BBOX)
+    assert updated["X"].size == data["X"].size + 1
+
+
+def test_slice_cache_eviction():
+    cache = SliceCache(max_bytes=250)
+    for key in range(3):
+        cache.put(key, {"X": np.zeros(10)})
+    assert len(cache) == 3
+    cache.get(0)
+    cache.put(3, {"X": np.zeros(10)})
+    assert cache.get(1) is None
+    assert cache.get(0) is not None
+    assert cache.nbytes == 240
+
+    cache.put(4, {"X": np.zeros(100)})
+    assert cache.get(4) is None
+
+
+def test_slice_cache_fetch_coalesces():
+    cache = SliceCache()
+    started = threading.Event()
+    finish = threading.Event()
+    reads = []
+
+    def read():
+        reads.append(1)
+        started.set()
+        finish.wait(10)
+        return {"X": np.zeros(10)}
+
+    with ThreadPoolExecutor(4) as pool:
+        first = pool.submit(cache.fetch, "key", read)
+        started.wait(10)
+        others = [pool.submit(cache.fetch, "key", read) for _ in range(3)]
+        finish.set()
+        results = [first.result(10)] + [f.result(10) for f in others]
+
+    assert len(reads) == 1
+    assert all(data is results[0] for data in results)
+    assert not results[0]["X"].flags.writeable
+
+
+def test_set_slice_cache_bytes(points_array):
+    slice_cache.clear()
+    create_point_cloud(points_array, BBOX)
+    assert len(slice_cache) == 1
+    try:
+        # disabled, the cached slices are evicted and no slices are cached
+        set_slice_cache_bytes(0)
+        assert len(slice_cache) == 0
+        create_point_cloud(points_array, BBOX)
+        assert len(slice_cache) == 0 and slice_cache.nbytes == 0
+        with pytest.raises(ValueError):
+            set_slice_cache_bytes(-1)
+    finally:
+        set_slice_cache_bytes()
+    assert slice_cache.max_bytes == DEFAULT_SLICE_CACHE_BYTES
+
+
+def test_slice_cache_acquire():
+    cache = SliceCache(max_bytes=250)
+    cache.put(0, {"X": np.zeros(10)})
+    key = cache.acquire(cache.get(0))
+    assert key == 0
+    assert cache.acquire({"X": np.zeros(10)}) is None
+
+    for key in range(1, 4):
+        cache.put(key, {"X": np.zeros(10)})
+    # the least recently used slice is held by a widget
+    assert cache.get(0) is not None
+    assert cache.get(1) is None
+
+    # released by the only widget holding it, the slice is dropped
+    cache.release(0)
+    assert cache.get(0) is None
+    assert cache.nbytes == 160
+
+    cache.put(4, {"X": np.zeros(10)})
+    key = cache.acquire(cache.get(4))
+    cache.acquire(cache.get(4))
+    cache.release(key)
+    assert cache.get(4) is not None
+    cache.release(key)
+    assert cache.get(4) is None
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        "X": rng.uniform(0, 100, n),
+        "Y": rng.uniform(0, 100, n),
+        "Z": rng.uniform(0, 10, n),
+        "Red": rng.integers(0, 255, n, dtype=np.uint8),
+    }
+
+
+@pytest.mark.parametrize("method", ["voxel", "random"])
+def test_downsample_point_cloud(method):
+    data = random_points(10000)
+    downsampled = downsample_point_cloud(data, 1000, method)
+
+    assert 900 <= downsampled["X"].size <= 1000
+    assert downsampled["Red"].dtype == np.uint8
+    for key in data:
+        assert data[key].min() <= downsampled[key].min()
+        assert downsampled[key].max() <= data[key].max()
+
+
+def test_downsample_point_cloud_voxel_averages():
+    data = {
+        "X": np.array([0.0, 0.0, 10.0, 10.0]),
+        "Y": np.array([0.0, 0.0, 10.0, 10.0]),
+        "Z": np.array([0.0, 1.0, 10.0, 9.0]),
+        "Red": np.array([10, 20, 200, 100], dtype=np.uint16),
+        "Classification": np.array([2, 6, 6, 2], dtype=np.uint8),
+    }
+    downsampled = downsample_point_cloud(data, 2)
+    np.testing.assert_array_equal(downsampled["Z"], [0.5, 9.5])
+    np.testing.assert_array_equal(downsampled["Red"], [15, 150])
+    # categorical attributes are not averaged
+    np.testing.assert_array_equal(downsampled["Classification"], [2, 6])
+
+
+def test_downsample_point_cloud_within_budget():
+    data = random_points(100)
+    assert downsample_point_cloud(data, 100) is data
+
+
+def test_create_mbrs(points_array):
+    d = create_mbrs(points_array)
+
+    fragments = tiledb.array_fragments(points_array, include_mbrs=True).mbrs
+    boxes = [box for fragment in fragments for box in fragment]
+
+    assert list(d["data"].keys()) == ["Xmin", "Xmax", "Ymin", "Ymax", "Zmin", "Zmax"]
+    assert d["data"]["Xmin"].size == len(boxes)
+    np.testing.assert_array_equal(d["data"]["Ymax"], [box[1][1] for box in boxes])
+    assert d["extents"] == [
+        min(box[0][0] for box in boxes),
+        max(box[0][1] for box in boxes),
+        min(box[1][0] for box in boxes),
+        max(box[1][1] for box in boxes),
+        min(box[2][0] for box in boxes),
+        max(box[2][1] for box in boxes),
+    ]
+
+
+def test_create_mbrs_until(points_array):
+    until = latest_timestamp(points_array)
+    boxes = create_mbrs(points_array)["data"]["Xmin"].size
+    write_points(points_array, until + 1)
+
+    # the fragments written afterwards are not shown
+    assert create_mbrs(points_array, until=until)["data"]["Xmin"].size == boxes
+    pinned = create_mbrs(points_array, box_budget=10_000, until=until)
+    assert pinned["data"]["Xmin"].size == boxes
+    # and are shown by a refresh instead
+    new = create_mbrs(points_array, since=until)["data"]["Xmin"].size
+    assert boxes + new == create_mbrs(points_array)["data"]["Xmin"].size
+
+
+def test_create_mbrs_2d(tmp_path):
+    uri = str(tmp_path / "2d")
+    dims = [
+        tiledb.Dim(name=name, domain=(0, 99), tile=10, dtype=np.int32)
+        for name in ["rows", "cols"]
+    ]
+    schema = tiledb.ArraySchema(
+        domain=tiledb.Domain(*dims),
+        attrs=[tiledb.Attr(name="a", dtype=np.int32)],
+        sparse=True,
+    )
+    tiledb.Array.create(uri, schema)
+    with tiledb.open(uri, "w") as arr:
+        arr[np.array([1, 50]), np.array([2, 60])] = np.array([1, 2], dtype=np.int32)
+
+    d = create_mbrs(uri)
+    assert list(d["data"].keys()) == ["Xmin", "Xmax", "Ymin", "Ymax"]
+    assert d["extents"] == [1, 50, 2, 60]
+
+
+def test_point_cloud_columns_structured():
+    points = np.zeros(10, dtype=[("x", "f8"), ("y", "f8"), ("z", "f8"), ("r", "u2")])
+    points["x"] = np.arange(10)
+    data = point_cloud_columns(points, {"x": "X", "y": "Y", "z": "Z"})
+
+    assert list(data) == ["X", "Y", "Z", "r"]
+    assert np.shares_memory(data["X"], points)
+    np.testing.assert_array_equal(data["X"], np.arange(10))
+
+
+def test_point_cloud_columns_dataframe():
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame({"x": np.arange(10.0), "Red": np.arange(10, dtype=np.uint16)})
+    data = point_cloud_columns(df, {"x": "X"})
+
+    assert np.shares_memory(data["X"], df["x"].to_numpy())
+    assert data["Red"].dtype == np.uint16
+
+
+def test_point_cloud_columns_arrow():
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"X": np.arange(10.0), "Red": np.arange(10, dtype=np.uint16)})
+    data = point_cloud_columns(table)
+
+    assert np.shares_memory(data["X"], table.column("X").chunk(0).to_numpy())
+    np.testing.assert_array_equal(data["Red"], np.arange(10))
+
+    chunked = pa.concat_tables([table, table])
+    assert point_cloud_columns(chunked)["X"].size == 20
+
+
+def test_point_cloud_columns_unsupported():
+    with pytest.raises(ValueError):
+        point_cloud_columns([1, 2, 3])
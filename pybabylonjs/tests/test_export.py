@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import re
+from base64 import standard_b64decode
+
+import numpy as np
+import pytest
+
+from pybabylonjs import Show
+from pybabylonjs.export import _export_data
+
+
+@pytest.fixture
+def widget(widgets):
+    rng = np.random.default_rng(0)
+    data = {dim: rng.uniform(0, 10, 100) for dim in ["X", "Y", "Z"]}
+    for color in ["Red", "Green", "Blue"]:
+        data[color] = rng.integers(0, 255, 100).astype(np.uint8)
+    return Show.from_dict(data=data, token="secret")
+
+
+def exported_state(path, widget):
+    html = path.read_text()
+    match = re.search(
+        r'<script type="application/vnd.jupyter.widget-state\+json">(.*?)</script>',
+        html,
+        re.S,
+    )
+    return html, json.loads(match.group(1))["state"][widget.model_id]
+
+
+def test_export_html(tmp_path, widget):
+    path = tmp_path / "points.html"
+    widget.export_html(str(path))
+
+    html, state = exported_state(path, widget)
+    assert "secret" not in html
+    value = state["state"]["value"]
+    assert value["streaming"] is False
+
+    buffers = {b["path"][2]: standard_b64decode(b["data"]) for b in state["buffers"]}
+    for name, column in widget.value["data"].items():
+        assert value["data"][name]["dtype"] == column.dtype.name
+        np.testing.assert_array_equal(
+            np.frombuffer(buffers[name], dtype=column.dtype), column
+        )
+
+
+def test_export_html_sidecar(tmp_path, widget):
+    path = tmp_path / "points.html"
+    widget.export_html(str(path), sidecar=True, quantize=0.01)
+
+    _, state = exported_state(path, widget)
+    assert "buffers" not in state
+    sidecar = (tmp_path / "points.bin").read_bytes()
+    for name, column in state["state"]["value"]["data"].items():
+        assert column["src"] == "points.bin"
+        assert column["byte_offset"] % 8 == 0
+        data = sidecar[
+            column["byte_offset"] : column["byte_offset"] + column["byte_length"]
+        ]
+        values = np.frombuffer(data, dtype=column["dtype"])
+        if "scale" in column:
+            values = values * column["scale"] + column["offset"]
+        np.testing.assert_allclose(values, widget.value["data"][name], atol=0.01)
+
+
+def test_export_html_scene(tmp_path, widget, points_array):
+    scene = Show.scene(
+        layers=[
+            {"name": "points", "data": widget.value["data"]},
+            {"name": "fragments", "kind": "mbrs", "uri": points_array},
+        ]
+    )
+    path = tmp_path / "scene.html"
+    scene.export_html(str(path))
+
+    # every column of every layer is a binary buffer the frontend decodes
+    _, state = exported_state(path, scene)
+    layers = state["state"]["value"]["layers"]
+    buffers = {
+        tuple(b["path"]): standard_b64decode(b["data"]) for b in state["buffers"]
+    }
+    for i, layer in enumerate(scene.value["layers"]):
+        assert set(layers[i]["data"]) == set(layer["data"])
+        for name, column in layer["data"].items():
+            buffer = buffers["value", "layers", i, "data", name, "buffer"]
+            np.testing.assert_array_equal(
+                np.frombuffer(buffer, dtype=layers[i]["data"][name]["dtype"]), column
+            )
+
+
+def test_export_data_point_budget(widgets, points_array):
+    bbox = {"X": [0, 500], "Y": [0, 1000], "Z": [0, 1000]}
+    widget = Show.point_cloud(
+        uri=points_array, source="local", bbox=bbox, point_budget=20
+    )
+    widget.send = lambda content, buffers=None: None
+    widget.update_bbox({"X": [250, 1000], "Y": [0, 1000], "Z": [0, 1000]})
+
+    # the points are read again for the new bbox and downsampled like the
+    # points shown
+    data = _export_data(widget)
+    assert 0 < data["X"].size <= 20
+    assert np.all(data["X"] >= 250)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import numpy as np
+import pytest
+import tiledb
+
+from pybabylonjs.data import create_mbrs, create_point_cloud
+from pybabylonjs.fragments import FragmentIndex, fragment_index
+from pybabylonjs.plan import estimate_point_cloud
+
+from .conftest import create_points_array
+
+
+def random_bboxes(rng, count):
+    for _ in range(count):
+        lo = rng.uniform(0, 900, 3)
+        hi = lo + rng.uniform(0, 300, 3)
+        yield {dim: [lo[d], hi[d]] for d, dim in enumerate(["X", "Y", "Z"])}
+
+
+@pytest.mark.parametrize("node_size", [2, 16])
+def test_query(tmp_path, node_size):
+    uri = create_points_array(str(tmp_path / "points"), fragments=5, points=300)
+    index = FragmentIndex.from_array(uri, node_size=node_size)
+    assert len(index) == 150
+
+    for bbox in random_bboxes(np.random.default_rng(1), 50):
+        box = np.array([bbox[dim] for dim in ["X", "Y", "Z"]])
+        expected = np.flatnonzero(
+            np.all(
+                (index.bounds[:, :, 0] <= box[:, 1])
+                & (box[:, 0] <= index.bounds[:, :, 1]),
+                axis=1,
+            )
+        )
+        np.testing.assert_array_equal(index.query(bbox), expected)
+
+
+def test_estimate(points_array):
+    index = FragmentIndex.from_array(points_array)
+    everything = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    assert index.estimate(everything) == pytest.approx(300)
+
+    bbox = {"X": [0, 500], "Y": [0, 1000], "Z": [0, 1000]}
+    count = create_point_cloud(points_array, bbox, cache=False)["X"].size
+    assert index.estimate(bbox) == pytest.approx(count, rel=0.5)
+    assert count <= index.max_points(bbox) < 300
+    assert index.max_points(everything) == 300
+
+
+def test_create_point_cloud_pruned(tmp_path):
+    uri = str(tmp_path / "points")
+    create_points_array(uri, fragments=1)
+    # a later fragment in a corner of the domain
+    with tiledb.open(uri, "w") as arr:
+        arr[np.array([990.0]), np.array([990.0]), np.array([990.0])] = {
+            "Red": np.array([1], dtype=np.uint16),
+            "Green": np.array([2], dtype=np.uint16),
+            "Blue": np.array([3], dtype=np.uint16),
+        }
+
+    index = FragmentIndex.from_array(uri)
+    corner = {"X": [995, 1000], "Y": [995, 1000], "Z": [995, 1000]}
+    assert index.fragments(corner).size == 0
+    data = create_point_cloud(uri, corner, cache=False, prune_fragments=True)
+    assert data["X"].size == 0
+    assert data["Red"].dtype == np.uint16
+
+    bbox = {"X": [980, 1000], "Y": [980, 1000], "Z": [980, 1000]}
+    np.testing.assert_array_equal(index.fragments(bbox), [1])
+    pruned = create_point_cloud(uri, bbox, cache=False, prune_fragments=True)
+    full = create_point_cloud(uri, bbox, cache=False)
+    for key in full:
+        np.testing.assert_array_equal(pruned[key], full[key])
+
+
+@pytest.mark.parametrize("box_budget", [200, 60, 7, 3, 1])
+def test_aggregate(tmp_path, box_budget):
+    uri = create_points_array(str(tmp_path / "points"), fragments=5, points=300)
+    index = FragmentIndex.from_array(uri)
+    boxes, counts = index.aggregate(box_budget)
+
+    assert boxes.shape[0] <= box_budget
+    assert counts.sum() == len(index)
+    # every MBR is inside one of the boxes
+    inside = np.all(
+        (boxes[None, :, :, 0] <= index.bounds[:, None, :, 0])
+        & (index.bounds[:, None, :, 1] <= boxes[None, :, :, 1]),
+        axis=2,
+    )
+    assert inside.any(axis=1).all()
+
+
+def test_create_mbrs_drill(tmp_path):
+    uri = create_points_array(str(tmp_path / "points"), fragments=5, points=300)
+    d = create_mbrs(uri, box_budget=20)
+    assert d["data"]["Xmin"].size <= 20
+
+    bbox = {"X": [0, 200], "Y": [0, 200], "Z": [0, 1000]}
+    drilled = create_mbrs(uri, box_budget=1000, bbox=bbox)
+    index = FragmentIndex.from_array(uri)
+    assert drilled["data"]["Xmin"].size == index.query(bbox).size
+    assert (drilled["data"]["Xmin"] <= 200).all()
+
+
+def test_fragments_without_mbrs(tmp_path, monkeypatch, points_array):
+    # the fragments of dense arrays have no MBRs
+    uri = str(tmp_path / "dense")
+    dim = tiledb.Dim(name="d", domain=(0, 9), tile=10, dtype=np.int32)
+    schema = tiledb.ArraySchema(
+        domain=tiledb.Domain(dim), attrs=[tiledb.Attr(name="a", dtype=np.int32)]
+    )
+    tiledb.Array.create(uri, schema)
+    with tiledb.open(uri, "w") as arr:
+        arr[:] = np.arange(10, dtype=np.int32)
+    assert fragment_index(uri) is None
+    with pytest.raises(ValueError):
+        FragmentIndex.from_array(uri)
+
+    # sparse fragments without MBRs are read without pruning
+    monkeypatch.setattr(
+        FragmentIndex, "_read", classmethod(lambda cls, uri, node_size=16: None)
+    )
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    data = create_point_cloud(points_array, bbox, cache=False, prune_fragments=True)
+    assert data["X"].size == 300
+    assert estimate_point_cloud(points_array, bbox)[0] >= 300
+    with pytest.raises(ValueError):
+        create_mbrs(points_array, box_budget=10)
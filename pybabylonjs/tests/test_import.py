@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import subprocess
+import sys
+
+
+def test_import_is_lazy():
+    # a fresh interpreter, the test session has already imported everything
+    code = (
+        "import sys, pybabylonjs; "
+        "print(sorted(m for m in ('tiledb', 'pandas') if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "[]"
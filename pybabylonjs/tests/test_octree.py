@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import numpy as np
+import pytest
+
+import pybabylonjs.octree
+from pybabylonjs.data import create_point_cloud
+from pybabylonjs.octree import PointCloudOctree
+
+from .conftest import create_points_array
+
+
+@pytest.fixture
+def octree(tmp_path):
+    uri = create_points_array(str(tmp_path / "points"), fragments=2, points=2000)
+    return PointCloudOctree(uri, node_size=100, cache_depth=1)
+
+
+def test_octree_nodes_are_disjoint(octree):
+    nodes = list(octree.traverse(point_budget=np.inf))
+    keys = [key for key, _ in nodes]
+    assert keys[0] == octree.ROOT
+    assert len(set(keys)) == len(keys)
+
+    bbox = {dim: list(bounds) for dim, bounds in zip(["X", "Y", "Z"], octree.bounds)}
+    full = create_point_cloud(octree.array_uri, bbox)
+    for dim in ["X", "Y", "Z", "Red"]:
+        np.testing.assert_array_equal(
+            np.sort(np.concatenate([data[dim] for _, data in nodes])),
+            np.sort(full[dim]),
+        )
+
+
+def test_octree_point_budget(octree):
+    nodes = list(octree.traverse(point_budget=1000))
+    assert 0 < sum(data["X"].size for _, data in nodes) <= 1000
+    # breadth first, the levels never decrease
+    depths = [key[0] for key, _ in nodes]
+    assert depths == sorted(depths)
+
+
+def test_octree_exclude_and_bbox(octree):
+    sent = {key for key, _ in octree.traverse(point_budget=1000)}
+    bbox = {"X": [0, 100], "Y": [0, 100], "Z": [0, 100]}
+    for key, _ in octree.traverse(point_budget=np.inf, bbox=bbox, exclude=sent):
+        assert key not in sent
+        node_bbox = octree.node_bbox(key)
+        assert all(node_bbox[dim][0] <= bbox[dim][1] for dim in bbox)
+
+
+def test_octree_bbox_reads_in_batches(tmp_path, monkeypatch):
+    uri = create_points_array(str(tmp_path / "points"), fragments=2, points=2000)
+    bbox = {"X": [0, 500], "Y": [0, 500], "Z": [0, 1000]}
+    batches = []
+    read = pybabylonjs.octree.iter_point_cloud
+
+    def iter_and_record(*args):
+        for batch in read(*args):
+            batches.append(batch["X"].size)
+            yield batch
+
+    monkeypatch.setattr(pybabylonjs.octree, "iter_point_cloud", iter_and_record)
+    octree = PointCloudOctree(uri, bbox, node_size=100, buffer_size=1024)
+
+    full = create_point_cloud(uri, bbox)
+    # only the points inside the bbox are indexed
+    assert full["X"].size <= octree.num_points < 4000
+    nodes = list(octree.traverse(point_budget=np.inf))
+    np.testing.assert_array_equal(
+        np.sort(np.concatenate([data["X"] for _, data in nodes])), np.sort(full["X"])
+    )
+    assert len(batches) > 1 and max(batches) <= 1024 // 8
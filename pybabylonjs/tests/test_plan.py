@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+
+import numpy as np
+import pytest
+import tiledb
+
+from pybabylonjs import Show
+from pybabylonjs.data import create_point_cloud
+from pybabylonjs.export import _export_data
+from pybabylonjs.plan import estimate_point_cloud, plan_point_cloud, read_point_cloud
+
+BBOX = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+
+
+def test_estimate_point_cloud(points_array):
+    points, point_bytes = estimate_point_cloud(points_array, BBOX)
+    assert points >= 300
+    # float64 coordinates and uint16 colors
+    assert point_bytes == 3 * 8 + 3 * 2
+
+    # an upper bound of the points read, within the data tiles crossing the bbox
+    bbox = {"X": [0, 300], "Y": [0, 1000], "Z": [0, 1000]}
+    count = create_point_cloud(points_array, bbox, cache=False)["X"].size
+    assert count <= estimate_point_cloud(points_array, bbox)[0] <= 2 * count
+
+
+def test_estimate_point_cloud_timestamp(points_array):
+    first = tiledb.array_fragments(points_array).timestamp_range[0][1]
+    count = create_point_cloud(points_array, BBOX, cache=False, timestamp=first)
+    assert count["X"].size == 100
+    # the fragments written later are not counted
+    assert estimate_point_cloud(points_array, BBOX, timestamp=first)[0] == 100
+
+
+def test_plan_point_cloud(points_array):
+    assert plan_point_cloud(points_array, BBOX).strategy == "read"
+
+    plan = plan_point_cloud(points_array, BBOX, memory_budget=1000)
+    assert plan.strategy == "chunked"
+    batches = read_point_cloud(points_array, BBOX, plan)
+    assert sum(batch["X"].size for batch in batches) == 300
+
+    plan = plan_point_cloud(points_array, BBOX, memory_budget=1000, point_budget=50)
+    assert plan.strategy == "sample"
+    assert plan.point_budget * 30 <= 1000
+    data = read_point_cloud(points_array, BBOX, plan, sampling="random")
+    assert 0 < data["X"].size <= plan.point_budget
+
+
+def test_point_cloud_memory_budget(widgets, points_array, caplog):
+    with caplog.at_level(logging.WARNING):
+        widget = Show.point_cloud(
+            uri=points_array,
+            source="local",
+            bbox=BBOX,
+            point_budget=20,
+            memory_budget=1000,
+        )
+    assert "exceed the memory budget" in caplog.text
+    assert 0 < widget.value["data"]["X"].size <= 20
+
+
+def test_point_cloud_chunked_plan(widgets, points_array):
+    widget = Show.point_cloud(
+        uri=points_array, source="local", bbox=BBOX, memory_budget=1000
+    )
+    # the value only holds the first batch, the plan is recorded with it so an
+    # export reads every batch again
+    plan = plan_point_cloud(points_array, BBOX, memory_budget=1000)
+    assert widget.value["buffer_size"] == plan.buffer_size
+    assert widget.value["data"]["X"].size <= 300
+    assert _export_data(widget)["X"].size == 300
+
+
+def test_scene_layer_memory_budget(widgets, points_array):
+    scene = Show.scene(
+        layers=[
+            {
+                "source": "local",
+                "uri": points_array,
+                "bbox": BBOX,
+                "point_budget": 20,
+                "memory_budget": 1000,
+            }
+        ]
+    )
+    assert 0 < scene.value["layers"][0]["data"]["X"].size <= 20
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import numpy as np
+import pytest
+
+from pybabylonjs.serializers import (
+    array_from_json,
+    array_to_json,
+    quantize_array,
+    value_from_json,
+    value_to_json,
+)
+
+
+def test_array_roundtrip():
+    arr = np.arange(10, dtype=np.float32)
+    encoded = array_to_json(arr)
+    assert encoded["dtype"] == "float32"
+    assert encoded["shape"] == [10]
+    assert isinstance(encoded["buffer"], memoryview)
+    np.testing.assert_array_equal(array_from_json(encoded), arr)
+
+
+def test_array_int64_as_float64():
+    encoded = array_to_json(np.arange(5, dtype=np.int64))
+    assert encoded["dtype"] == "float64"
+
+
+def test_value_roundtrip():
+    data = {
+        "X": np.linspace(0, 1, 4),
+        "Red": np.array([0, 1, 2, 3], dtype=np.uint16),
+    }
+    value = {"source": "dict", "point_size": 2, "data": data}
+    encoded = value_to_json(value, None)
+    assert encoded["point_size"] == 2
+    assert all(
+        isinstance(col["buffer"], memoryview) for col in encoded["data"].values()
+    )
+
+    decoded = value_from_json(encoded, None)
+    np.testing.assert_array_equal(decoded["data"]["X"], data["X"])
+    np.testing.assert_array_equal(decoded["data"]["Red"], data["Red"])
+
+
+def test_scene_value_roundtrip():
+    data = {"X": np.linspace(0, 1, 4), "Red": np.arange(4, dtype=np.uint16)}
+    value = {"quantize": True, "layers": [{"name": "a", "data": data}]}
+    encoded = value_to_json(value, None)
+    layer = encoded["layers"][0]
+    assert layer["data"]["X"]["dtype"] == "uint16"
+    assert layer["rgb_max"] == 255
+
+    decoded = value_from_json(encoded, None)["layers"][0]
+    np.testing.assert_allclose(decoded["data"]["X"], data["X"], atol=0.001)
+
+
+def test_value_without_data():
+    value = {"source": "cloud", "data": {}}
+    assert value_to_json(value, None) == value
+
+
+def test_quantized_value():
+    rng = np.random.default_rng(0)
+    data = {
+        "X": rng.uniform(500000, 500050, 100),
+        "Y": rng.uniform(0, 1000, 100),
+        "Z": rng.uniform(0, 10, 100),
+        "Red": rng.integers(0, 65535, 100).astype(np.uint16),
+    }
+    value = {"quantize": True, "bbox": {"X": [500000, 500050]}, "data": data}
+    encoded = value_to_json(value, None)
+
+    assert encoded["rgb_max"] == 255
+    assert encoded["data"]["X"]["dtype"] == "uint16"
+    assert encoded["data"]["X"]["offset"] == 500000
+    assert encoded["data"]["Y"]["dtype"] == "uint32"
+    assert encoded["data"]["Red"]["dtype"] == "uint8"
+
+    decoded = value_from_json(encoded, None)
+    for dim in ["X", "Y", "Z"]:
+        np.testing.assert_allclose(decoded["data"][dim], data[dim], atol=0.0005)
+    np.testing.assert_allclose(
+        decoded["data"]["Red"], data["Red"] / 257, atol=0.5 + 1e-9
+    )
+
+
+@pytest.mark.parametrize("quantize", [None, True])
+def test_compressed_value(quantize):
+    rng = np.random.default_rng(0)
+    data = {
+        # coordinates on a centimetre grid, as in LiDAR data
+        "X": np.round(rng.uniform(0, 100, 10000), 2),
+        "Red": rng.integers(0, 255, 10000).astype(np.uint16),
+        "Small": np.arange(10, dtype=np.float32),
+    }
+    value = {"compression": "deflate", "quantize": quantize, "data": data}
+    encoded = value_to_json(value, None)
+
+    assert encoded["data"]["X"]["compression"] == "deflate"
+    assert encoded["data"]["X"]["buffer"].nbytes < 0.75 * data["X"].nbytes
+    assert "compression" not in encoded["data"]["Small"]
+
+    decoded = value_from_json(encoded, None)
+    np.testing.assert_allclose(decoded["data"]["X"], data["X"], atol=0.0005)
+    np.testing.assert_array_equal(decoded["data"]["Small"], data["Small"])
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        value_to_json({"compression": "brotli", "data": {"X": np.zeros(1000)}}, None)
+
+
+def test_quantize_array_rounds_within_range():
+    # the maximum rounds up to 65536 steps, which does not fit in uint16
+    encoded = quantize_array([0, 65.5357], 0.001)
+    assert encoded["dtype"] == "uint32"
+    np.testing.assert_allclose(array_from_json(encoded), [0, 65.5357], atol=0.001)
+
+    encoded = quantize_array([0, 65.535], 0.001)
+    assert encoded["dtype"] == "uint16"
+    np.testing.assert_allclose(array_from_json(encoded), [0, 65.535], atol=0.001)
+
+    encoded = quantize_array([0, 1e10], 0.001)
+    assert encoded["dtype"] == "uint32"
+    np.testing.assert_allclose(array_from_json(encoded), [0, 1e10], rtol=1e-9)
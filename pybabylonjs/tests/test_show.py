@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import threading
+
+import numpy as np
+import pytest
+import tiledb
+
+import pybabylonjs.show
+from pybabylonjs import Show
+from pybabylonjs.background import load_in_background
+from pybabylonjs.babylonjs import BabylonPointCloud
+from pybabylonjs.serializers import array_from_json
+
+from .conftest import custom_msg
+
+
+def test_point_cloud_local(widgets, points_array):
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    widget = Show.point_cloud(uri=points_array, source="local", bbox=bbox)
+
+    assert widgets == [widget]
+    value = widget.value
+    assert value["source"] == "local"
+    assert value["data"]["X"].size == 300
+
+
+def test_from_dict_color_by(widgets):
+    rng = np.random.default_rng(0)
+    data = {dim: rng.uniform(0, 10, 100) for dim in ["X", "Y", "Z"]}
+    data["Intensity"] = rng.integers(0, 1000, 100).astype(np.uint16)
+    data["ReturnNumber"] = rng.integers(1, 4, 100).astype(np.uint8)
+
+    value = Show.from_dict(data=data, attributes=["Intensity"]).value
+    assert value["color_by"] == "Intensity"
+    assert list(value["data"]) == ["X", "Y", "Z", "Intensity"]
+
+    with pytest.raises(ValueError):
+        Show.from_dict(data=data)
+
+
+def test_point_cloud_asynchronous(widgets, points_array, monkeypatch):
+    loaded = threading.Event()
+    load = pybabylonjs.show._load_point_cloud
+
+    def load_and_notify(*args, **kwargs):
+        load(*args, **kwargs)
+        loaded.set()
+
+    monkeypatch.setattr(pybabylonjs.show, "_load_point_cloud", load_and_notify)
+
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    widget = Show.point_cloud(
+        uri=points_array, source="local", bbox=bbox, asynchronous=True
+    )
+
+    # displayed before the data is read
+    assert widgets == [widget]
+    assert loaded.wait(10)
+    assert "loading" not in widget.value
+    assert widget.value["data"]["X"].size == 300
+
+
+def test_load_in_background_cancels_previous_load():
+    release = threading.Event()
+    dataviz = BabylonPointCloud()
+
+    def slow_load(cancelled):
+        release.wait(10)
+        if not cancelled.is_set():
+            dataviz.value = {"data": {"X": np.zeros(1)}}
+
+    first, first_cancelled = load_in_background(dataviz, slow_load, key="cell")
+    second, second_cancelled = load_in_background(
+        dataviz, lambda cancelled: None, key="cell"
+    )
+    release.set()
+    first.result(10)
+    second.result(10)
+
+    assert first_cancelled.is_set()
+    assert not second_cancelled.is_set()
+    assert dataviz.value == {}
+
+
+def test_load_in_background_error():
+    dataviz = BabylonPointCloud()
+    dataviz.value = {"loading": True}
+
+    def failing_load(cancelled):
+        raise ValueError("uri: missing does not exist.")
+
+    future, _ = load_in_background(dataviz, failing_load)
+    future.result(10)
+    assert dataviz.value == {"loading": False, "error": "uri: missing does not exist."}
+
+
+def test_point_cloud_stats(widgets, points_array):
+    reported = []
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    widget = Show.point_cloud(
+        uri=points_array,
+        source="local",
+        bbox=bbox,
+        buffer_size=1024,
+        on_stats=reported.append,
+    )
+
+    stats = widget.stats
+    assert reported == [stats]
+    assert {"validate", "open", "query", "encode", "sync"} <= set(stats.timings)
+    assert stats.points == 300
+    assert stats.messages > 1
+    # coordinates as float64 and colors as uint16
+    assert stats.bytes_sent == 300 * (3 * 8 + 3 * 2)
+
+    # syncing the value to another view sends no new data
+    messages = stats.messages
+    widget.get_state()
+    assert (stats.points, stats.messages) == (300, messages)
+
+
+def test_update_bbox(widgets, points_array):
+    bbox = {"X": [0, 500], "Y": [0, 1000], "Z": [0, 1000]}
+    dataviz = Show.point_cloud(
+        uri=points_array, source="local", bbox=bbox, point_budget=20
+    )
+    sent = []
+    dataviz.send = lambda content, buffers=None: sent.append(content)
+
+    moved = {"X": [250, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    dataviz.update_bbox(moved)
+    assert sent[0] == {"type": "crop", "bbox": moved}
+    # the points entering the slice use the part of the budget left by the
+    # points kept, the frontend shows at most the point budget in total
+    x = dataviz.value["data"]["X"]
+    kept = np.count_nonzero((x >= 250) & (x <= 1000))
+    assert 0 < kept < 20
+    assert sent[1]["type"] == "append"
+    appended = sent[1]["columns"][0]["shape"][0]
+    assert 0 < appended <= 20 - kept
+    assert dataviz.value["bbox"] == moved
+
+    # back to the first bbox, the budget is shared the same way
+    dataviz.update_bbox(bbox)
+    shown = dataviz.shown["X"]
+    assert shown.size <= 20 and np.all(shown <= 500)
+
+
+def test_refresh(widgets, points_array):
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    points = Show.point_cloud(uri=points_array, source="local", bbox=bbox)
+    mbrs = Show.mbrs(points_array)
+    sent = []
+    for widget in [points, mbrs]:
+        widget.send = lambda content, buffers=None: sent.append((content, buffers))
+    boxes = mbrs.value["data"]["Xmin"].size
+
+    assert points.refresh() == 0
+    assert mbrs.refresh() == 0
+    assert sent == []
+
+    with tiledb.open(points_array, "w", timestamp=points.timestamp + 1) as arr:
+        arr[np.array([10.0]), np.array([20.0]), np.array([30.0])] = {
+            "Red": np.array([1], dtype=np.uint16),
+            "Green": np.array([2], dtype=np.uint16),
+            "Blue": np.array([3], dtype=np.uint16),
+        }
+
+    def appended(message):
+        content, buffers = message
+        assert content["type"] == "append"
+        return {
+            col["name"]: array_from_json({**col, "buffer": buffer})
+            for col, buffer in zip(content["columns"], buffers)
+        }
+
+    assert points.refresh() == 1
+    assert appended(sent[-1]) == {
+        "X": [10.0],
+        "Y": [20.0],
+        "Z": [30.0],
+        "Red": [1],
+        "Green": [2],
+        "Blue": [3],
+    }
+    assert mbrs.refresh() == 1
+    columns = appended(sent[-1])
+    assert set(columns) == set(mbrs.value["data"])
+    assert columns["Xmin"] == [10.0] and columns["Zmax"] == [30.0]
+    assert sent[-1][0]["extents"] == mbrs.value["extents"]
+    # new views and exports show the new box as well
+    assert mbrs.value["data"]["Xmin"].size == boxes + 1
+    # the new fragment is only read once
+    assert points.refresh() == 0
+    assert mbrs.refresh() == 0
+
+
+def test_scene(widgets, points_array):
+    rng = np.random.default_rng(0)
+    data = {dim: rng.uniform(0, 10, 100) for dim in ["X", "Y", "Z"]}
+    for color in ["Red", "Green", "Blue"]:
+        data[color] = rng.integers(0, 255, 100).astype(np.uint8)
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+
+    scene = Show.scene(
+        layers=[
+            {"name": "dict", "data": data, "point_budget": 50},
+            {"name": "local", "source": "local", "uri": points_array, "bbox": bbox},
+            {"name": "fragments", "kind": "mbrs", "uri": points_array},
+        ],
+        compression=True,
+    )
+
+    assert scene.layers == ["dict", "local", "fragments"]
+    layers = scene.value["layers"]
+    assert layers[0]["data"]["X"].size <= 50
+    assert layers[0]["rgb_max"] == 255
+    assert layers[1]["data"]["X"].size == 300
+    assert "Xmin" in layers[2]["data"]
+
+    sent = []
+    scene.send = lambda content, buffers=None: sent.append(content)
+    scene.set_visible("fragments", False)
+    assert sent == [{"type": "visibility", "layer": "fragments", "visible": False}]
+    assert not layers[2]["visible"]
+    with pytest.raises(ValueError):
+        scene.set_visible("missing")
+
+    with pytest.raises(ValueError):
+        Show.scene(layers=[{"name": "a", "data": data}, {"name": "a", "data": data}])
+
+
+def test_request_nodes(widgets, points_array):
+    dataviz = Show.point_cloud(
+        uri=points_array, source="local", streaming=True, point_budget=50
+    )
+    assert dataviz.value["octree"] and not dataviz.value["streaming"]
+    sent = []
+    dataviz.send = lambda content, buffers=None: sent.append(content)
+    shown = len(dataviz.sent_nodes)
+
+    dataviz._handle_msg(custom_msg({"type": "request_nodes", "point_budget": 10**6}))
+    assert len(dataviz.sent_nodes) > shown
+    assert sent and all(content["type"] == "append" for content in sent)
+
+
+def test_request_boxes(widgets, points_array):
+    dataviz = Show.mbrs(points_array, box_budget=2)
+    assert dataviz.value["data"]["Xmin"].size <= 2
+
+    bbox = {"X": [0, 500], "Y": [0, 1000], "Z": [0, 1000]}
+    dataviz._handle_msg(
+        custom_msg({"type": "request_boxes", "bbox": bbox, "box_budget": 1000})
+    )
+    assert dataviz.value["bbox"] == bbox
+    assert dataviz.value["box_budget"] == 1000
+    assert dataviz.value["data"]["Xmin"].size > 2
+    assert (dataviz.value["data"]["Xmin"] <= 500).all()
+
+
+def test_release_data(widgets):
+    from pybabylonjs.babylonjs import memory_usage
+
+    rng = np.random.default_rng(0)
+    data = {dim: rng.uniform(0, 10, 100) for dim in ["X", "Y", "Z", "Intensity"]}
+    released = Show.from_dict(data=data, attributes=["Intensity"], release_data=True)
+    kept = Show.from_dict(data=data, attributes=["Intensity"])
+
+    assert released.nbytes == 4 * 100 * 8
+    assert (released, released.nbytes) in memory_usage()
+
+    # the frontend acknowledges the value through a custom comm message
+    released._handle_msg(custom_msg({"type": "value_received"}))
+    kept._handle_msg(custom_msg({"type": "value_received"}))
+    assert released.nbytes == 0
+    assert released.value["color_by"] == "Intensity"
+    assert kept.nbytes == 4 * 100 * 8
+    with pytest.raises(ValueError):
+        released.export_html("released.html")
+
+    kept.close()
+    assert kept.nbytes == 0
+    assert kept not in [widget for widget, _ in memory_usage()]
+
+
+def test_point_cloud_shared_slice(widgets, points_array):
+    from pybabylonjs.data import slice_cache
+
+    slice_cache.clear()
+    bbox = {"X": [0, 1000], "Y": [0, 1000], "Z": [0, 1000]}
+    first, second = [
+        Show.point_cloud(
+            uri=points_array, source="local", bbox=bbox, point_size=point_size
+        )
+        for point_size in [2, 4]
+    ]
+    assert first.value["data"]["X"] is second.value["data"]["X"]
+    assert first.slice_key is not None
+    assert first.slice_key == second.slice_key
+
+    first.close()
+    assert first.slice_key is None
+    assert slice_cache.get(second.slice_key) is not None
+    key = second.slice_key
+    # the memory of the slice is freed with the last widget showing it
+    second.close()
+    assert slice_cache.get(key) is None and slice_cache.nbytes == 0
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) TileDB, Inc..
+# Distributed under the terms of the Modified BSD License.
+
+import threading
+
+import numpy as np
+import pytest
+import tiledb
+
+from pybabylonjs import Show
+from pybabylonjs.tiles import ImageTileServer
+
+from .conftest import custom_msg
+
+
+def create_image_array(uri, image):
+    channels, height, width = image.shape
+    dims = [
+        tiledb.Dim(name=name, domain=(0, size - 1), tile=min(size, 64), dtype=np.uint32)
+        for name, size in zip(["C", "Y", "X"], image.shape)
+    ]
+    schema = tiledb.ArraySchema(
+        domain=tiledb.Domain(*dims),
+        attrs=[tiledb.Attr(name="intensity", dtype=np.uint8)],
+    )
+    tiledb.Array.create(uri, schema)
+    with tiledb.open(uri, "w") as arr:
+        arr[:] = image
+
+
+@pytest.fixture
+def image(tmp_path):
+    rng = np.random.default_rng(0)
+    full = rng.integers(0, 255, size=(3, 300, 200), dtype=np.uint8)
+    uri = str(tmp_path / "image")
+    tiledb.Group.create(uri)
+    with tiledb.Group(uri, "w") as group:
+        # the smaller level is added first, levels are ordered by size
+        for name, level in [("l_1", full[:, ::2, ::2]), ("l_0", full)]:
+            create_image_array(f"{uri}/{name}", level)
+            group.add(name, relative=True)
+    return uri, full
+
+
+def test_tile(image):
+    uri, full = image
+    server = ImageTileServer(uri, tile_size=128)
+    assert [level["domain"][1][1] for level in server.levels] == [299, 149]
+
+    np.testing.assert_array_equal(server.tile(0, 1, 0), full[:, 128:256, 0:128])
+    # tiles on the border are clipped to the image
+    np.testing.assert_array_equal(server.tile(0, 2, 1), full[:, 256:300, 128:200])
+    np.testing.assert_array_equal(
+        server.tile(1, 0, 0), full[:, ::2, ::2][:, 0:128, 0:100]
+    )
+    with pytest.raises(ValueError):
+        server.tile(1, 2, 0)
+
+    assert server.tile(0, 1, 0) is server.tile(0, 1, 0)
+    server.close()
+
+
+def test_image_local(widgets, image, monkeypatch):
+    uri, full = image
+    dataviz = Show.image(uri=uri, source="local", tile_size=128)
+
+    assert dataviz.value["source"] == "local"
+    assert dataviz.value["tile_size"] == 128
+    assert len(dataviz.value["levels"]) == 2
+    level = dataviz.value["levels"][0]
+    assert [level["dims"], level["y"], level["x"]] == [["C", "Y", "X"], "Y", "X"]
+
+    sent = []
+    received = threading.Event()
+
+    def send(content, buffers=None):
+        sent.append((content, buffers))
+        received.set()
+
+    monkeypatch.setattr(dataviz, "send", send)
+    # the tile is read on the thread pool of the tile server
+    dataviz._handle_msg(
+        custom_msg({"type": "request_tile", "level": 0, "row": 0, "col": 1, "id": 7})
+    )
+    assert received.wait(10)
+    dataviz.request_tile(0, 5, 0, id=8).result()
+
+    content, buffers = sent[0]
+    assert content["id"] == 7
+    assert content["shape"] == [3, 128, 72]
+    np.testing.assert_array_equal(
+        np.frombuffer(buffers[0], dtype=content["dtype"]).reshape(content["shape"]),
+        full[:, 0:128, 128:200],
+    )
+    assert sent[1][0]["id"] == 8
+    assert "error" in sent[1][0]
@@ -0,0 +1,174 @@
+# Copyright 2023 TileDB Inc.
+# Licensed under the MIT License.
+"""Tiles of local multi-resolution TileDB image arrays, served over the widget comm."""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .data import SliceCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_SIZE = 256
+DEFAULT_TILE_CACHE_BYTES = 256 * 1024**2
+
+
+def _spatial_dims(schema):
+    """Names of the Y and X dimensions of an image array, the last two by default."""
+    names = [schema.domain.dim(i).name for i in range(schema.domain.ndim)]
+    if "Y" in names and "X" in names:
+        return "Y", "X"
+    return names[-2], names[-1]
+
+
+def image_levels(uri: str):
+    """Resolution levels of a local image, from the largest to the smallest.
+
+    The uri is either a single array or a group with one array per level, as
+    written by TileDB-BioImaging.
+    """
+    import tiledb
+
+    if tiledb.object_type(uri) == "group":
+        with tiledb.Group(uri) as group:
+            uris = [member.uri for member in group if member.type is tiledb.Array]
+    else:
+        uris = [uri]
+
+    levels = []
+    for level_uri in uris:
+        with tiledb.open(level_uri) as arr:
+            schema = arr.schema
+            y, x = _spatial_dims(schema)
+            levels.append(
+                {
+                    "uri": level_uri,
+                    "dims": [
+                        schema.domain.dim(i).name for i in range(schema.domain.ndim)
+                    ],
+                    "domain": [
+                        [int(lo), int(hi)]
+                        for lo, hi in (
+                            schema.domain.dim(i).domain
+                            for i in range(schema.domain.ndim)
+                        )
+                    ],
+                    "y": y,
+                    "x": x,
+                    "attr": schema.attr(0).name,
+                    "dtype": schema.attr(0).dtype,
+                }
+            )
+    if not levels:
+        raise ValueError(f"No image arrays found in {uri}")
+
+    def size(level):
+        return np.prod([hi - lo + 1 for lo, hi in level["domain"]])
+
+    return sorted(levels, key=size, reverse=True)
+
+
+class ImageTileServer:
+    """Read tiles of a local multi-resolution image on a thread pool.
+
+    Level 0 is the full resolution image, tile (row, col) of a level covers
+    tile_size pixels along Y and X from row * tile_size and col * tile_size,
+    with all the values of the other dimensions such as channels.
+
+    :param uri: URI of the image array or group of level arrays
+    :param tile_size: size of the tiles along Y and X in pixels
+    :param cache_bytes: budget of the LRU cache of the tiles already read
+    :param num_threads: number of tiles read concurrently, by default the
+        ThreadPoolExecutor default
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        tile_size: int = DEFAULT_TILE_SIZE,
+        cache_bytes: int = DEFAULT_TILE_CACHE_BYTES,
+        num_threads=None,
+    ):
+        self.uri = uri
+        self.tile_size = tile_size
+        self.levels = image_levels(uri)
+        self.cache = SliceCache(cache_bytes)
+        # the cache is shared by the threads reading tiles
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_threads, thread_name_prefix="pybabylonjs-tiles"
+        )
+
+    def metadata(self):
+        """Description of the levels sent to the frontend."""
+        return {
+            "tile_size": self.tile_size,
+            "levels": [
+                {
+                    "dims": level["dims"],
+                    "domain": level["domain"],
+                    "dtype": level["dtype"].name,
+                    "y": level["y"],
+                    "x": level["x"],
+                }
+                for level in self.levels
+            ],
+        }
+
+    def _read(self, level, row, col):
+        import tiledb
+
+        info = self.levels[level]
+        index = []
+        for name, (lo, hi) in zip(info["dims"], info["domain"]):
+            if name == info["y"]:
+                start = lo + row * self.tile_size
+            elif name == info["x"]:
+                start = lo + col * self.tile_size
+            else:
+                index.append(slice(lo, hi))
+                continue
+            if start > hi:
+                raise ValueError(f"Tile {(level, row, col)} is outside of the image")
+            # multi_index ranges are inclusive
+            index.append(slice(start, min(start + self.tile_size - 1, hi)))
+
+        with tiledb.open(info["uri"]) as arr:
+            return arr.query(attrs=[info["attr"]]).multi_index[tuple(index)][
+                info["attr"]
+            ]
+
+    def tile(self, level: int, row: int, col: int):
+        """Values of a tile, read from the array or the cache."""
+        key = (level, row, col)
+        with self._lock:
+            cached = self.cache.get(key)
+        if cached is not None:
+            return cached["tile"]
+        tile = self._read(level, row, col)
+        with self._lock:
+            self.cache.put(key, {"tile": tile})
+        return tile
+
+    def submit(self, level: int, row: int, col: int, callback):
+        """Read a tile on the thread pool and call callback(tile, error) when done."""
+
+        def run():
+            try:
+                tile = self.tile(level, row, col)
+            except Exception as e:
+                logger.exception(
+                    "Reading tile %s of %s failed", (level, row, col), self.uri
+                )
+                callback(None, e)
+            else:
+                callback(tile, None)
+
+        return self._executor.submit(run)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.cache.clear()
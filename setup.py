@@ -54,6 +54,7 @@ setup_args = dict(
             "python-pdal",
             "pandas",
             "cv2",
+            "pytest-benchmark",
         ],
     },
     url=pkg_json["homepage"],
@@ -72,6 +73,7 @@ setup_args = dict(
     keywords=["Jupyter", "JupyterLab", "JupyterLab3"],
     install_requires=[
         "ipywidgets>=7",
+        "numpy",
     ],
     classifiers=[
         "License :: OSI Approved :: MIT License",
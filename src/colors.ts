@@ -0,0 +1,88 @@
+// Copyright 2023 TileDB Inc.
+// Licensed under the MIT License.
+
+type Color = [number, number, number];
+
+// evenly spaced stops, values in between are interpolated
+const ramps: { [name: string]: Color[] } = {
+  viridis: [
+    [68, 1, 84],
+    [72, 40, 120],
+    [62, 74, 137],
+    [49, 104, 142],
+    [38, 130, 142],
+    [31, 158, 137],
+    [53, 183, 121],
+    [109, 205, 89],
+    [180, 222, 44],
+    [253, 231, 37]
+  ],
+  grayscale: [
+    [0, 0, 0],
+    [255, 255, 255]
+  ]
+};
+
+// colors of the integer values of categorical attributes such as classifications
+const categories: Color[] = [
+  [31, 119, 180],
+  [255, 127, 14],
+  [44, 160, 44],
+  [214, 39, 40],
+  [148, 103, 189],
+  [140, 86, 75],
+  [227, 119, 194],
+  [127, 127, 127],
+  [188, 189, 34],
+  [23, 190, 207]
+];
+
+/**
+ * Replace the colors of the points by the values of an attribute mapped
+ * through a color ramp, the colors are 8 bit.
+ */
+export function applyColorRamp(
+  data: any,
+  attribute: string,
+  ramp?: string | null
+): any {
+  const values = data?.[attribute];
+  if (!values) {
+    return data;
+  }
+  const n = values.length;
+  const red = new Uint8Array(n);
+  const green = new Uint8Array(n);
+  const blue = new Uint8Array(n);
+
+  if (ramp === 'categorical') {
+    for (let i = 0; i < n; i++) {
+      const k = Math.abs(Math.round(values[i])) % categories.length;
+      [red[i], green[i], blue[i]] = categories[k];
+    }
+    return { ...data, Red: red, Green: green, Blue: blue };
+  }
+
+  const stops = ramps[ramp ?? 'viridis'];
+  if (!stops) {
+    throw new Error(`Unknown color ramp: ${ramp}`);
+  }
+  let min = Infinity;
+  let max = -Infinity;
+  for (let i = 0; i < n; i++) {
+    min = Math.min(min, values[i]);
+    max = Math.max(max, values[i]);
+  }
+  const scale = max > min ? (stops.length - 1) / (max - min) : 0;
+  for (let i = 0; i < n; i++) {
+    const t = (values[i] - min) * scale;
+    const k = Math.min(Math.floor(t), stops.length - 2);
+    const f = t - k;
+    const a = stops[k];
+    const b = stops[k + 1];
+    red[i] = a[0] + (b[0] - a[0]) * f;
+    green[i] = a[1] + (b[1] - a[1]) * f;
+    blue[i] = a[2] + (b[2] - a[2]) * f;
+  }
+  return { ...data, Red: red, Green: green, Blue: blue };
+}
@@ -0,0 +1,131 @@
+// Copyright 2023 TileDB Inc.
+// Licensed under the MIT License.
+
+import { TypedArray } from './serializers';
+
+type Color = [number, number, number];
+
+// colors of the MBRs layers without a color, in the order of the layers
+const mbrsColors: Color[] = [
+  [255, 127, 14],
+  [44, 160, 44],
+  [214, 39, 40],
+  [148, 103, 189]
+];
+
+export interface ILayer {
+  name: string;
+  kind: 'point_cloud' | 'mbrs';
+  visible: boolean;
+  color?: Color | null;
+  rgb_max?: number;
+  data: { [key: string]: TypedArray };
+}
+
+// the 12 edges of a box as pairs of corners, a corner is a bit per dimension
+const edges: [number, number][] = [
+  [0, 1],
+  [2, 3],
+  [4, 5],
+  [6, 7],
+  [0, 2],
+  [1, 3],
+  [4, 6],
+  [5, 7],
+  [0, 4],
+  [1, 5],
+  [2, 6],
+  [3, 7]
+];
+
+function checkDecoded(layer: ILayer): void {
+  for (const [name, column] of Object.entries(layer.data)) {
+    if (!ArrayBuffer.isView(column)) {
+      throw new Error(
+        `Column ${name} of layer ${layer.name} has not been decoded`
+      );
+    }
+  }
+}
+
+function numPoints(layer: ILayer, edgePoints: number): number {
+  if (layer.kind === 'mbrs') {
+    return layer.data.Xmin.length * edges.length * edgePoints;
+  }
+  return layer.data.X.length;
+}
+
+/**
+ * Merge the visible layers of a scene into the points of one point cloud
+ * with 8 bit colors, the MBRs are drawn as points along their edges.
+ */
+export function sceneData(
+  layers: ILayer[],
+  edgePoints = 16
+): { [key: string]: TypedArray } {
+  const visible = layers.filter(layer => layer.visible);
+  visible.forEach(checkDecoded);
+  const n = visible.reduce(
+    (sum, layer) => sum + numPoints(layer, edgePoints),
+    0
+  );
+  const X = new Float64Array(n);
+  const Y = new Float64Array(n);
+  const Z = new Float64Array(n);
+  const Red = new Uint8Array(n);
+  const Green = new Uint8Array(n);
+  const Blue = new Uint8Array(n);
+
+  let i = 0;
+  let mbrsLayer = 0;
+  for (const layer of layers) {
+    if (layer.kind === 'mbrs' && !layer.color) {
+      // the colors do not change when other layers are hidden
+      layer.color = mbrsColors[mbrsLayer++ % mbrsColors.length];
+    }
+    if (!layer.visible) {
+      continue;
+    }
+    const start = i;
+    const data = layer.data;
+
+    if (layer.kind === 'mbrs') {
+      const zmin = data.Zmin;
+      const zmax = data.Zmax;
+      for (let j = 0; j < data.Xmin.length; j++) {
+        const lo = [data.Xmin[j], data.Ymin[j], zmin ? zmin[j] : 0];
+        const hi = [data.Xmax[j], data.Ymax[j], zmax ? zmax[j] : 0];
+        for (const [c0, c1] of edges) {
+          const p0 = [0, 1, 2].map(d => ((c0 >> d) & 1 ? hi[d] : lo[d]));
+          const p1 = [0, 1, 2].map(d => ((c1 >> d) & 1 ? hi[d] : lo[d]));
+          for (let k = 0; k < edgePoints; k++) {
+            const t = edgePoints > 1 ? k / (edgePoints - 1) : 0.5;
+            X[i] = p0[0] + (p1[0] - p0[0]) * t;
+            Y[i] = p0[1] + (p1[1] - p0[1]) * t;
+            Z[i] = p0[2] + (p1[2] - p0[2]) * t;
+            i++;
+          }
+        }
+      }
+    } else {
+      X.set(data.X, i);
+      Y.set(data.Y, i);
+      Z.set(data.Z, i);
+      i += data.X.length;
+    }
+
+    if (layer.color) {
+      Red.fill(layer.color[0], start, i);
+      Green.fill(layer.color[1], start, i);
+      Blue.fill(layer.color[2], start, i);
+    } else {
+      const scale = 255 / (layer.rgb_max ?? 65535);
+      for (let p = 0; p < i - start; p++) {
+        Red[start + p] = data.Red[p] * scale;
+        Green[start + p] = data.Green[p] * scale;
+        Blue[start + p] = data.Blue[p] * scale;
+      }
+    }
+  }
+  return { X, Y, Z, Red, Green, Blue };
+}
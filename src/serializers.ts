@@ -0,0 +1,299 @@
+// Copyright 2023 TileDB Inc.
+// Licensed under the MIT License.
+
+export type TypedArray =
+  | Int8Array
+  | Uint8Array
+  | Int16Array
+  | Uint16Array
+  | Int32Array
+  | Uint32Array
+  | Float32Array
+  | Float64Array;
+
+const typedArrays: { [dtype: string]: any } = {
+  int8: Int8Array,
+  uint8: Uint8Array,
+  int16: Int16Array,
+  uint16: Uint16Array,
+  int32: Int32Array,
+  uint32: Uint32Array,
+  float32: Float32Array,
+  float64: Float64Array
+};
+
+interface IEncodedArray {
+  dtype: string;
+  shape: number[];
+  buffer: DataView | ArrayBuffer;
+  // quantized coordinates: value = offset + buffer[i] * scale
+  scale?: number;
+  offset?: number;
+  // codec of a compressed buffer
+  compression?: string;
+}
+
+function isEncodedArray(value: any): value is IEncodedArray {
+  return (
+    value !== null &&
+    typeof value === 'object' &&
+    'dtype' in value &&
+    'shape' in value &&
+    'buffer' in value
+  );
+}
+
+/**
+ * Create a typed array from a binary buffer received over the comm,
+ * quantized values are converted back to coordinates.
+ */
+export function arrayFromJSON(value: IEncodedArray): TypedArray {
+  const array = typedArrayFromJSON(value);
+  if (value.scale === undefined) {
+    return array;
+  }
+  const scale = value.scale;
+  const offset = value.offset ?? 0;
+  const dequantized = new Float64Array(array.length);
+  for (let i = 0; i < array.length; i++) {
+    dequantized[i] = offset + array[i] * scale;
+  }
+  return dequantized;
+}
+
+function typedArrayFromJSON(value: IEncodedArray): TypedArray {
+  const ctor = typedArrays[value.dtype];
+  if (!ctor) {
+    throw new Error(`Unsupported dtype: ${value.dtype}`);
+  }
+  const buffer = value.buffer;
+  if (buffer instanceof DataView) {
+    if (buffer.byteOffset % ctor.BYTES_PER_ELEMENT !== 0) {
+      // typed arrays need an aligned offset, copy the bytes when it is not
+      return new ctor(
+        buffer.buffer.slice(
+          buffer.byteOffset,
+          buffer.byteOffset + buffer.byteLength
+        )
+      );
+    }
+    return new ctor(
+      buffer.buffer,
+      buffer.byteOffset,
+      buffer.byteLength / ctor.BYTES_PER_ELEMENT
+    );
+  }
+  return new ctor(buffer);
+}
+
+/**
+ * Decompress a buffer with the native DecompressionStream of the browser.
+ */
+async function decompress(
+  buffer: DataView | ArrayBuffer,
+  codec: string
+): Promise<ArrayBuffer> {
+  if (codec !== 'deflate') {
+    throw new Error(`Unsupported compression: ${codec}`);
+  }
+  const stream = new Blob([buffer])
+    .stream()
+    .pipeThrough(new (globalThis as any).DecompressionStream('deflate'));
+  return new Response(stream).arrayBuffer();
+}
+
+/**
+ * Create a typed array from a binary buffer that may be compressed.
+ */
+export async function decodeArray(value: IEncodedArray): Promise<TypedArray> {
+  if (value.compression === undefined) {
+    return arrayFromJSON(value);
+  }
+  const buffer = await decompress(value.buffer, value.compression);
+  return arrayFromJSON({ ...value, buffer });
+}
+
+interface IExternalArray {
+  dtype: string;
+  shape: number[];
+  scale?: number;
+  offset?: number;
+  compression?: string;
+  // column stored in a binary file next to an exported page
+  src: string;
+  byte_offset: number;
+  byte_length: number;
+}
+
+function isExternalArray(value: any): value is IExternalArray {
+  return (
+    value !== null &&
+    typeof value === 'object' &&
+    'dtype' in value &&
+    'src' in value &&
+    'byte_offset' in value
+  );
+}
+
+// the binary files of exported pages, fetched once for all their columns
+const externalFiles = new Map<string, Promise<ArrayBuffer>>();
+
+async function fetchExternalArray(value: IExternalArray): Promise<TypedArray> {
+  let file = externalFiles.get(value.src);
+  if (file === undefined) {
+    file = fetch(value.src).then(response => {
+      if (!response.ok) {
+        throw new Error(`Cannot load ${value.src}: ${response.statusText}`);
+      }
+      return response.arrayBuffer();
+    });
+    externalFiles.set(value.src, file);
+  }
+  const buffer = new DataView(
+    await file,
+    value.byte_offset,
+    value.byte_length
+  );
+  return decodeArray({ ...value, buffer });
+}
+
+/**
+ * Decode every binary column of a data dictionary.
+ */
+export async function dataFromJSON(data: any): Promise<any> {
+  if (data === null || typeof data !== 'object') {
+    return data;
+  }
+  const decoded: { [key: string]: any } = {};
+  await Promise.all(
+    Object.keys(data).map(async key => {
+      const column = data[key];
+      if (isEncodedArray(column)) {
+        decoded[key] = await decodeArray(column);
+      } else if (isExternalArray(column)) {
+        decoded[key] = await fetchExternalArray(column);
+      } else {
+        decoded[key] = column;
+      }
+    })
+  );
+  return decoded;
+}
+
+/**
+ * Deserialize the value trait of a widget, with `data` sent as binary buffers,
+ * and the `data` of every layer of a scene.
+ */
+export async function valueFromJSON(value: any): Promise<any> {
+  if (value === null || typeof value !== 'object') {
+    return value;
+  }
+  const decoded = { ...value };
+  if ('data' in value) {
+    decoded.data = await dataFromJSON(value.data);
+  }
+  if (Array.isArray(value.layers)) {
+    decoded.layers = await Promise.all(value.layers.map(valueFromJSON));
+  }
+  return decoded;
+}
+
+interface IColumn {
+  name: string;
+  dtype: string;
+  shape: number[];
+  scale?: number;
+  offset?: number;
+  compression?: string;
+}
+
+/**
+ * Decode the columns of a custom message, sent with one binary buffer per column.
+ */
+export async function dataFromBuffers(
+  columns: IColumn[],
+  buffers: (DataView | ArrayBuffer)[]
+): Promise<{ [key: string]: TypedArray }> {
+  const data: { [key: string]: TypedArray } = {};
+  await Promise.all(
+    columns.map(async (column, i) => {
+      data[column.name] = await decodeArray({ ...column, buffer: buffers[i] });
+    })
+  );
+  return data;
+}
+
+// buffers allocated by concatData, the space after their columns is free
+const grownBuffers = new WeakSet<ArrayBufferLike>();
+
+/**
+ * Concatenate the columns of two data dictionaries.
+ *
+ * The columns are views of buffers with spare capacity that doubles when it
+ * is used up, so appending batches one by one copies every point a constant
+ * number of times on average instead of once per batch.
+ */
+export function concatData(data: any, other: any): any {
+  if (!data || Object.keys(data).length === 0) {
+    return other;
+  }
+  const merged: { [key: string]: any } = {};
+  for (const key of Object.keys(other)) {
+    const a = data[key];
+    const b = other[key];
+    if (!a) {
+      merged[key] = b;
+      continue;
+    }
+    const length = a.length + b.length;
+    let column;
+    if (
+      a.constructor === b.constructor &&
+      grownBuffers.has(a.buffer) &&
+      a.byteOffset === 0 &&
+      a.buffer.byteLength >= length * a.BYTES_PER_ELEMENT
+    ) {
+      column = new a.constructor(a.buffer, 0, length);
+    } else {
+      const ctor =
+        a.constructor === b.constructor ? a.constructor : Float64Array;
+      const grown = new ctor(Math.max(length, 2 * a.length));
+      grownBuffers.add(grown.buffer);
+      grown.set(a);
+      column = grown.subarray(0, length);
+    }
+    column.set(b, a.length);
+    merged[key] = column;
+  }
+  return merged;
+}
+
+/**
+ * Keep the points of a data dictionary inside an inclusive bbox.
+ */
+export function cropData(
+  data: any,
+  bbox: { [dim: string]: [number, number] }
+): any {
+  if (!data || !data.X) {
+    return data;
+  }
+  const inside = (dim: string, i: number): boolean =>
+    !bbox[dim] || (data[dim][i] >= bbox[dim][0] && data[dim][i] <= bbox[dim][1]);
+  const keep: number[] = [];
+  for (let i = 0; i < data.X.length; i++) {
+    if (inside('X', i) && inside('Y', i) && inside('Z', i)) {
+      keep.push(i);
+    }
+  }
+  const cropped: { [key: string]: any } = {};
+  for (const key of Object.keys(data)) {
+    const column = data[key];
+    const result = new column.constructor(keep.length);
+    keep.forEach((row, i) => {
+      result[i] = column[row];
+    });
+    cropped[key] = result;
+  }
+  return cropped;
+}
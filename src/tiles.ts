@@ -0,0 +1,257 @@
+// Copyright 2023 TileDB Inc.
+// Licensed under the MIT License.
+
+import { TypedArray } from './serializers';
+
+export interface ITile {
+  level: number;
+  row: number;
+  col: number;
+  shape: number[];
+  data: TypedArray;
+}
+
+export interface ILevel {
+  dims: string[];
+  domain: [number, number][];
+  dtype: string;
+  y: string;
+  x: string;
+}
+
+// value shown at full intensity, 1 for floating point images
+const channelMax: { [dtype: string]: number } = {
+  uint8: 255,
+  uint16: 65535,
+  uint32: 4294967295,
+  int8: 127,
+  int16: 32767,
+  int32: 2147483647
+};
+
+/**
+ * RGBA pixels of a tile, the first three values of the other dimensions are
+ * the red, green and blue channels and a single one is shown in grey.
+ */
+export function tilePixels(tile: ITile, level: ILevel): ImageData {
+  const shape = tile.shape;
+  const strides = shape.map(
+    (_, axis) => shape.slice(axis + 1).reduce((a, b) => a * b, 1)
+  );
+  const yAxis = level.dims.indexOf(level.y);
+  const xAxis = level.dims.indexOf(level.x);
+  const height = shape[yAxis];
+  const width = shape[xAxis];
+
+  // offsets of the channels, the other dimensions in row-major order
+  let offsets = [0];
+  shape.forEach((size, axis) => {
+    if (axis !== yAxis && axis !== xAxis) {
+      offsets = offsets.flatMap(offset =>
+        Array.from({ length: size }, (_, i) => offset + i * strides[axis])
+      );
+    }
+  });
+  const channels = offsets.length === 1 ? [0, 0, 0] : offsets.slice(0, 3);
+
+  const scale = 255 / (channelMax[level.dtype] ?? 1);
+  const pixels = new ImageData(width, height);
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      const base = y * strides[yAxis] + x * strides[xAxis];
+      const p = (y * width + x) * 4;
+      channels.forEach((offset, c) => {
+        pixels.data[p + c] = tile.data[base + offset] * scale;
+      });
+      pixels.data[p + 3] = 255;
+    }
+  }
+  return pixels;
+}
+
+/**
+ * Pan and zoom a multi-resolution image on a 2D canvas, the tiles of the
+ * level matching the zoom are requested as they come into view and the
+ * coarsest level fills in the tiles still loading.
+ */
+export class TileImageViewer {
+  private context: CanvasRenderingContext2D;
+  // decoded tiles by level/row/col, null while a tile is loading
+  private tiles = new Map<string, ImageBitmap | null>();
+  // canvas pixels per pixel of level 0, and canvas position of its origin
+  private scale: number;
+  private x = 0;
+  private y = 0;
+  private drag?: { x: number; y: number };
+  private pendingDraw?: number;
+
+  constructor(
+    private canvas: HTMLCanvasElement,
+    private levels: ILevel[],
+    private tileSize: number,
+    private requestTile: (
+      level: number,
+      row: number,
+      col: number
+    ) => Promise<ITile>
+  ) {
+    const context = canvas.getContext('2d');
+    if (!context) {
+      throw new Error('The canvas has no 2D context');
+    }
+    this.context = context;
+    const [height, width] = this.size(0);
+    this.scale = Math.min(canvas.width / width, canvas.height / height);
+
+    canvas.addEventListener('wheel', this.onWheel, { passive: false });
+    canvas.addEventListener('pointerdown', this.onPointerDown);
+    canvas.addEventListener('pointermove', this.onPointerMove);
+    canvas.addEventListener('pointerup', this.onPointerUp);
+  }
+
+  /**
+   * Height and width of a level in pixels.
+   */
+  private size(level: number): [number, number] {
+    const { dims, domain, y, x } = this.levels[level];
+    const [y0, y1] = domain[dims.indexOf(y)];
+    const [x0, x1] = domain[dims.indexOf(x)];
+    return [y1 - y0 + 1, x1 - x0 + 1];
+  }
+
+  /**
+   * Pixels of level 0 per pixel of a level.
+   */
+  private factor(level: number): number {
+    return this.size(0)[1] / this.size(level)[1];
+  }
+
+  /**
+   * The coarsest level with at least one pixel per canvas pixel, levels are
+   * ordered from the largest to the smallest.
+   */
+  private currentLevel(): number {
+    let level = 0;
+    while (
+      level + 1 < this.levels.length &&
+      this.factor(level + 1) * this.scale <= 1
+    ) {
+      level++;
+    }
+    return level;
+  }
+
+  draw(): void {
+    this.context.clearRect(0, 0, this.canvas.width, this.canvas.height);
+    const coarsest = this.levels.length - 1;
+    const current = this.currentLevel();
+    this.drawLevel(coarsest);
+    if (current !== coarsest) {
+      this.drawLevel(current);
+    }
+  }
+
+  private drawLevel(level: number): void {
+    const [height, width] = this.size(level);
+    // size of a tile on the canvas
+    const size = this.tileSize * this.factor(level) * this.scale;
+    const first = (offset: number) => Math.max(Math.floor(-offset / size), 0);
+    const last = (offset: number, extent: number, pixels: number) =>
+      Math.min(
+        Math.floor((extent - offset) / size),
+        Math.ceil(pixels / this.tileSize) - 1
+      );
+
+    for (
+      let row = first(this.y);
+      row <= last(this.y, this.canvas.height, height);
+      row++
+    ) {
+      for (
+        let col = first(this.x);
+        col <= last(this.x, this.canvas.width, width);
+        col++
+      ) {
+        const key = `${level}/${row}/${col}`;
+        const bitmap = this.tiles.get(key);
+        if (bitmap) {
+          const scale = size / this.tileSize;
+          this.context.drawImage(
+            bitmap,
+            this.x + col * size,
+            this.y + row * size,
+            bitmap.width * scale,
+            bitmap.height * scale
+          );
+        } else if (bitmap === undefined) {
+          this.load(level, row, col, key);
+        }
+      }
+    }
+  }
+
+  private load(level: number, row: number, col: number, key: string): void {
+    this.tiles.set(key, null);
+    this.requestTile(level, row, col)
+      .then(tile => createImageBitmap(tilePixels(tile, this.levels[level])))
+      .then(bitmap => {
+        this.tiles.set(key, bitmap);
+        this.scheduleDraw();
+      })
+      // tiles that failed to load are not requested again
+      .catch(error => console.error(error));
+  }
+
+  private scheduleDraw(): void {
+    if (this.pendingDraw === undefined) {
+      this.pendingDraw = requestAnimationFrame(() => {
+        this.pendingDraw = undefined;
+        this.draw();
+      });
+    }
+  }
+
+  private onWheel = (event: WheelEvent): void => {
+    event.preventDefault();
+    // the pixel under the pointer stays in place
+    const rect = this.canvas.getBoundingClientRect();
+    const px = event.clientX - rect.left;
+    const py = event.clientY - rect.top;
+    const zoom = Math.exp(-event.deltaY * 0.002);
+    this.x = px - (px - this.x) * zoom;
+    this.y = py - (py - this.y) * zoom;
+    this.scale *= zoom;
+    this.scheduleDraw();
+  };
+
+  private onPointerDown = (event: PointerEvent): void => {
+    this.canvas.setPointerCapture(event.pointerId);
+    this.drag = { x: event.clientX, y: event.clientY };
+  };
+
+  private onPointerMove = (event: PointerEvent): void => {
+    if (this.drag) {
+      this.x += event.clientX - this.drag.x;
+      this.y += event.clientY - this.drag.y;
+      this.drag = { x: event.clientX, y: event.clientY };
+      this.scheduleDraw();
+    }
+  };
+
+  private onPointerUp = (event: PointerEvent): void => {
+    this.canvas.releasePointerCapture(event.pointerId);
+    this.drag = undefined;
+  };
+
+  destroy(): void {
+    if (this.pendingDraw !== undefined) {
+      cancelAnimationFrame(this.pendingDraw);
+    }
+    this.canvas.removeEventListener('wheel', this.onWheel);
+    this.canvas.removeEventListener('pointerdown', this.onPointerDown);
+    this.canvas.removeEventListener('pointermove', this.onPointerMove);
+    this.canvas.removeEventListener('pointerup', this.onPointerUp);
+    this.tiles.forEach(bitmap => bitmap?.close());
+    this.tiles.clear();
+  }
+}
@@ -8,6 +8,16 @@ import {
 } from '@jupyter-widgets/base';
 
 import { MODULE_NAME, MODULE_VERSION } from './version';
+import { applyColorRamp } from './colors';
+import { ILayer, sceneData } from './scene';
+import { ITile, TileImageViewer } from './tiles';
+import {
+  arrayFromJSON,
+  concatData,
+  cropData,
+  dataFromBuffers,
+  valueFromJSON
+} from './serializers';
 import '../css/widget.css';
 import {
   TileDBTileImageVisualization,
@@ -23,8 +33,61 @@ export class BabylonBaseModel extends DOMWidgetModel {
   static view_module_version = MODULE_VERSION;
 
   static serializers: ISerializers = {
-    ...DOMWidgetModel.serializers
+    ...DOMWidgetModel.serializers,
+    value: { deserialize: valueFromJSON }
   };
+
+  // decoding compressed columns is asynchronous, messages are handled in order
+  private received: Promise<void> = Promise.resolve();
+
+  initialize(attributes: any, options: any): void {
+    super.initialize(attributes, options);
+    this.on(
+      'msg:custom',
+      (msg: any, buffers: DataView[]) => {
+        // a value sent before the message may still be decoding, the message
+        // applies to that value and not to the one it replaces
+        this.received = Promise.all([this.received, this.state_change])
+          .then(() => this.onCustomMessage(msg, buffers))
+          .catch(error => console.error(error));
+      },
+      this
+    );
+    this.on('change:value', this.acknowledgeValue, this);
+    this.acknowledgeValue();
+  }
+
+  /**
+   * Tell the kernel the data of the value has been received, a widget created
+   * with release_data drops its copy of the data then.
+   */
+  private acknowledgeValue(): void {
+    const value = this.get('value');
+    if (value?.data || value?.layers) {
+      this.send({ type: 'value_received' }, {});
+    }
+  }
+
+  protected async onCustomMessage(
+    msg: any,
+    buffers: DataView[]
+  ): Promise<void> {
+    if (msg.type === 'append') {
+      const data = await dataFromBuffers(msg.columns, buffers);
+      const value = this.get('value');
+      value.data = concatData(value.data, data);
+      if (msg.extents) {
+        // the MBRs of new fragments can extend the array
+        value.extents = msg.extents;
+      }
+      this.trigger('data:changed');
+    } else if (msg.type === 'crop') {
+      const value = this.get('value');
+      value.data = cropData(value.data, msg.bbox);
+      value.bbox = msg.bbox;
+      this.trigger('query:changed');
+    }
+  }
 }
 
 abstract class BabylonBaseView extends DOMWidgetView {
@@ -37,11 +100,125 @@ abstract class BabylonBaseView extends DOMWidgetView {
   moveSpeed = this.values.move_speed;
   inspector = this.values.inspector;
 
+  private pendingRender?: number;
+  // camera of the visualization being rebuilt, restored once the scene is ready
+  private camera?: { [property: string]: any };
+
+  initialize(parameters: any): void {
+    super.initialize(parameters);
+    this.listenTo(this.model, 'data:changed', this.data_changed);
+    this.listenTo(this.model, 'change:value', this.data_changed);
+    this.listenTo(this.model, 'query:changed', this.query_changed);
+  }
+
+  /**
+   * Show the loading state or error of data read in the background instead
+   * of the visualization, returns false when the data is ready.
+   */
+  protected render_status(): boolean {
+    const status =
+      this.values.error ?? (this.values.loading ? 'Loading…' : undefined);
+    if (status === undefined) {
+      return false;
+    }
+    const div = document.createElement('div');
+    div.className = this.values.error
+      ? 'pybabylonjs-status pybabylonjs-error'
+      : 'pybabylonjs-status';
+    div.style.width = this.values.width;
+    div.style.height = this.values.height;
+    div.textContent = status;
+    this.el.appendChild(div);
+    return true;
+  }
+
   protected query_changed(): void {
-    // TODO
+    // the points outside the new bbox are removed from the data, the points
+    // entering it follow as appended data
+    this.data_changed();
+  }
+
+  protected data_changed(): void {
+    // batches can arrive faster than the scene is rebuilt, render once per frame
+    if (this.pendingRender !== undefined) {
+      return;
+    }
+    this.pendingRender = requestAnimationFrame(() => {
+      this.pendingRender = undefined;
+      this.values = this.model.get('value');
+      // the scene is rebuilt with the new data, the view of the user is kept
+      this.camera = this.cameraState() ?? this.camera;
+      this.visualization?.destroy();
+      this.visualization = undefined;
+      this.el.replaceChildren();
+      this.render();
+      this.restoreCamera();
+    });
+  }
+
+  /**
+   * Position of the active camera of the scene, its angles and target for an
+   * arc rotate camera or its position and rotation otherwise.
+   */
+  private cameraState(): { [property: string]: any } | undefined {
+    const camera = (this.visualization as any)?.scene?.activeCamera;
+    if (!camera) {
+      return undefined;
+    }
+    if (typeof camera.alpha === 'number') {
+      const { alpha, beta, radius } = camera;
+      return { alpha, beta, radius, target: camera.target.clone() };
+    }
+    return {
+      position: camera.position.clone(),
+      rotation: camera.rotation?.clone()
+    };
+  }
+
+  /**
+   * Apply the saved camera to the rebuilt scene once it has a camera, the
+   * scene is created asynchronously after render.
+   */
+  private restoreCamera(frames = 60): void {
+    const visualization = this.visualization as any;
+    const state = this.camera;
+    if (!visualization || !state) {
+      return;
+    }
+    const scene = visualization.scene;
+    if (!scene?.activeCamera) {
+      if (frames > 0) {
+        requestAnimationFrame(() => {
+          if (this.visualization === visualization) {
+            this.restoreCamera(frames - 1);
+          }
+        });
+      }
+      return;
+    }
+    scene.executeWhenReady(() => {
+      const camera = scene.activeCamera;
+      if (state.alpha !== undefined && typeof camera.alpha === 'number') {
+        camera.setTarget(state.target);
+        camera.alpha = state.alpha;
+        camera.beta = state.beta;
+        camera.radius = state.radius;
+      } else if (state.position) {
+        camera.position.copyFrom(state.position);
+        if (state.rotation) {
+          camera.rotation?.copyFrom(state.rotation);
+        }
+      }
+      if (this.camera === state) {
+        this.camera = undefined;
+      }
+    });
   }
 
   remove() {
+    if (this.pendingRender !== undefined) {
+      cancelAnimationFrame(this.pendingRender);
+    }
     this.visualization?.destroy();
     super.remove();
   }
@@ -60,12 +237,28 @@ export class BabylonPointCloudModel extends BabylonBaseModel {
     };
   }
 
+  /**
+   * Request the nodes of a local array streamed from the kernel, up to a
+   * point budget including the points shown, the points are received as
+   * appended data.
+   */
+  requestNodes(pointBudget?: number, bbox?: any): void {
+    this.send({ type: 'request_nodes', point_budget: pointBudget, bbox }, {});
+  }
+
   static model_name = 'BabylonPointCloudModel';
   static view_name = 'BabylonPointCloudView';
 }
 
 export class BabylonPointCloudView extends BabylonBaseView {
   render() {
+    if (this.render_status()) {
+      return;
+    }
+    if (this.values.octree) {
+      this.el.appendChild(this.moreNodesButton());
+    }
+    const colorBy = this.values.color_by;
     this.visualization = new TileDBPointCloudVisualization({
       width: this.values.width,
       height: this.values.height,
@@ -75,14 +268,16 @@ export class BabylonPointCloudView extends BabylonBaseView {
       rootElement: this.el,
       //mode: this.values.mode,
       colorScheme: this.values.color_scheme,
-      data: this.values.data,
+      data: colorBy
+        ? applyColorRamp(this.values.data, colorBy, this.values.color_ramp)
+        : this.values.data,
       zScale: this.values.z_scale,
       //topoOffset: this.values.topo_offset,
       //classes: this.values.classes,
       //timeOffset: this.values.time_offset,
       source: this.values.source,
       //pointShift: this.values.point_shift,
-      rgbMax: this.values.rgb_max,
+      rgbMax: colorBy ? 255 : this.values.rgb_max,
       bbox: this.values.bbox,
       namespace: this.values.name_space,
       arrayName: this.values.array_name,
@@ -107,6 +302,26 @@ export class BabylonPointCloudView extends BabylonBaseView {
     });
     this.visualization.render();
   }
+
+  /**
+   * A button requesting the next nodes of the octree from the kernel, twice
+   * the points shown.
+   */
+  private moreNodesButton(): HTMLElement {
+    const div = document.createElement('div');
+    div.className = 'pybabylonjs-controls';
+    const button = document.createElement('button');
+    button.textContent = 'More points';
+    button.addEventListener('click', () => {
+      button.disabled = true;
+      const shown = this.values.data?.X?.length ?? 0;
+      (this.model as BabylonPointCloudModel).requestNodes(
+        Math.max(2 * shown, 1)
+      );
+    });
+    div.appendChild(button);
+    return div;
+  }
 }
 
 export class BabylonMBRSModel extends BabylonBaseModel {
@@ -122,12 +337,23 @@ export class BabylonMBRSModel extends BabylonBaseModel {
     };
   }
 
+  /**
+   * Request finer boxes inside a bbox from the kernel, or the boxes of the
+   * whole array without a bbox, the boxes are received as a new value.
+   */
+  requestBoxes(bbox?: any, boxBudget?: number): void {
+    this.send({ type: 'request_boxes', bbox, box_budget: boxBudget }, {});
+  }
+
   static model_name = 'BabylonMBRSModel';
   static view_name = 'BabylonMBRSView';
 }
 
 export class BabylonMBRSView extends BabylonBaseView {
   render() {
+    if (this.values.box_budget) {
+      this.el.appendChild(this.boxBudgetInput());
+    }
     this.visualization = new TileDBMBRSVisualization({
       data: this.values.data,
       extents: this.values.extents,
@@ -141,9 +367,180 @@ export class BabylonMBRSView extends BabylonBaseView {
     });
     this.visualization.render();
   }
+
+  /**
+   * The number of boxes shown, changing it requests the boxes of the same
+   * bbox with the new budget from the kernel.
+   */
+  private boxBudgetInput(): HTMLElement {
+    const div = document.createElement('div');
+    div.className = 'pybabylonjs-controls';
+    const label = document.createElement('label');
+    const input = document.createElement('input');
+    input.type = 'number';
+    input.min = '1';
+    input.value = String(this.values.box_budget);
+    input.addEventListener('change', () => {
+      const boxBudget = Math.floor(Number(input.value));
+      if (boxBudget >= 1) {
+        (this.model as BabylonMBRSModel).requestBoxes(
+          this.values.bbox ?? undefined,
+          boxBudget
+        );
+      }
+    });
+    label.append('Boxes ', input);
+    div.appendChild(label);
+    return div;
+  }
+}
+
+export class BabylonSceneModel extends BabylonBaseModel {
+  defaults(): any {
+    return {
+      ...super.defaults(),
+      _model_name: BabylonSceneModel.model_name,
+      _model_module: BabylonSceneModel.model_module,
+      _model_module_version: BabylonSceneModel.model_module_version,
+      _view_name: BabylonSceneModel.view_name,
+      _view_module: BabylonSceneModel.view_module,
+      _view_module_version: BabylonSceneModel.view_module_version
+    };
+  }
+
+  /**
+   * Show or hide a layer, hidden layers keep their data in the model.
+   */
+  setLayerVisible(name: string, visible: boolean): void {
+    const layers: ILayer[] = this.get('value').layers ?? [];
+    const layer = layers.find(layer => layer.name === name);
+    if (layer && layer.visible !== visible) {
+      layer.visible = visible;
+      this.trigger('data:changed');
+    }
+  }
+
+  protected async onCustomMessage(
+    msg: any,
+    buffers: DataView[]
+  ): Promise<void> {
+    if (msg.type === 'visibility') {
+      this.setLayerVisible(msg.layer, msg.visible);
+    } else {
+      return super.onCustomMessage(msg, buffers);
+    }
+  }
+
+  static model_name = 'BabylonSceneModel';
+  static view_name = 'BabylonSceneView';
+}
+
+export class BabylonSceneView extends BabylonBaseView {
+  render() {
+    if (this.render_status()) {
+      return;
+    }
+    this.el.appendChild(this.layerToggles());
+    this.visualization = new TileDBPointCloudVisualization({
+      width: this.values.width,
+      height: this.values.height,
+      wheelPrecision: this.values.wheel_precision,
+      moveSpeed: this.values.move_speed,
+      inspector: this.values.inspector,
+      rootElement: this.el,
+      colorScheme: this.values.color_scheme,
+      data: sceneData(this.values.layers, this.values.edge_points ?? undefined),
+      zScale: this.values.z_scale,
+      source: 'dict',
+      rgbMax: 255,
+      pointType: this.values.point_type,
+      pointSize: this.values.point_size,
+      cameraLocation: this.values.camera_location,
+      cameraZoomOut: this.values.camera_zoom,
+      cameraUp: this.values.camera_up,
+      edlStrength: this.values.edl_strength,
+      edlRadius: this.values.edl_radius,
+      edlNeighbours: this.values.edl_neighbours,
+      useShader: this.values.use_shader,
+      useSPS: this.values.use_sps,
+      debug: this.values.debug
+    });
+    this.visualization.render();
+  }
+
+  /**
+   * A checkbox per layer, toggling a layer only rebuilds the scene from the
+   * data kept in the model.
+   */
+  private layerToggles(): HTMLElement {
+    const div = document.createElement('div');
+    div.className = 'pybabylonjs-layers';
+    for (const layer of this.values.layers as ILayer[]) {
+      const label = document.createElement('label');
+      const checkbox = document.createElement('input');
+      checkbox.type = 'checkbox';
+      checkbox.checked = layer.visible;
+      checkbox.addEventListener('change', () =>
+        (this.model as BabylonSceneModel).setLayerVisible(
+          layer.name,
+          checkbox.checked
+        )
+      );
+      label.append(checkbox, layer.name);
+      div.appendChild(label);
+    }
+    return div;
+  }
 }
 
 export class BabylonTileImageModel extends BabylonBaseModel {
+  private pendingTiles = new Map<
+    number,
+    { resolve: (tile: ITile) => void; reject: (error: Error) => void }
+  >();
+  private nextTileId = 0;
+
+  /**
+   * Request a tile of a local image served by the kernel, tiles of level 0
+   * are at full resolution.
+   */
+  requestTile(level: number, row: number, col: number): Promise<ITile> {
+    const id = this.nextTileId++;
+    return new Promise((resolve, reject) => {
+      this.pendingTiles.set(id, { resolve, reject });
+      this.send({ type: 'request_tile', id, level, row, col }, {});
+    });
+  }
+
+  protected async onCustomMessage(
+    msg: any,
+    buffers: DataView[]
+  ): Promise<void> {
+    if (msg.type !== 'tile') {
+      return super.onCustomMessage(msg, buffers);
+    }
+    const pending = this.pendingTiles.get(msg.id);
+    if (!pending) {
+      return;
+    }
+    this.pendingTiles.delete(msg.id);
+    if (msg.error) {
+      pending.reject(new Error(msg.error));
+      return;
+    }
+    pending.resolve({
+      level: msg.level,
+      row: msg.row,
+      col: msg.col,
+      shape: msg.shape,
+      data: arrayFromJSON({
+        dtype: msg.dtype,
+        shape: msg.shape,
+        buffer: buffers[0]
+      })
+    });
+  }
+
   defaults(): any {
     return {
       ...super.defaults(),
@@ -161,7 +558,15 @@ export class BabylonTileImageModel extends BabylonBaseModel {
 }
 
 export class BabylonTileImageView extends BabylonBaseView {
+  private viewer?: TileImageViewer;
+
   render() {
+    this.viewer?.destroy();
+    this.viewer = undefined;
+    if (this.values.source === 'local') {
+      this.renderLocal();
+      return;
+    }
     this.visualization = new TileDBTileImageVisualization({
       engineAPI: this.values.engine_api,
       namespace: this.values.name_space,
@@ -182,4 +587,29 @@ export class BabylonTileImageView extends BabylonBaseView {
 
     this.visualization.render();
   }
+
+  /**
+   * Draw a local image on a 2D canvas with the tiles requested from the kernel.
+   */
+  private renderLocal(): void {
+    const canvas = document.createElement('canvas');
+    canvas.className = 'pybabylonjs-tiles';
+    canvas.width = parseInt(this.values.width);
+    canvas.height = parseInt(this.values.height);
+    this.el.appendChild(canvas);
+
+    const model = this.model as BabylonTileImageModel;
+    this.viewer = new TileImageViewer(
+      canvas,
+      this.values.levels,
+      this.values.tile_size,
+      (level, row, col) => model.requestTile(level, row, col)
+    );
+    this.viewer.draw();
+  }
+
+  remove() {
+    this.viewer?.destroy();
+    super.remove();
+  }
 }